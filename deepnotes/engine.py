@@ -1,3 +1,4 @@
+import asyncio
 from typing import Dict, List, Type
 
 from deepnotes.loaders.base_loader import BaseLoader
@@ -27,6 +28,13 @@ class DeepNotesEngine:
 
     def process_source(self, config: SourceConfig):
         """Process a single source using appropriate loader"""
+        return asyncio.run(self.aprocess_source(config))
+
+    async def aprocess_source(self, config: SourceConfig):
+        """
+        Async counterpart of process_source. Analysis and merging share the
+        caller's event loop, and with it the LLM connection pools.
+        """
         loader_class = self.loaders.get(config.type)
         if not loader_class:
             raise ValueError(f"No loader found for source type: {config.type}")
@@ -35,14 +43,26 @@ class DeepNotesEngine:
         if not loader.validate_config():
             raise ValueError(f"Invalid configuration for source: {config.name}")
 
-        loaded_data = loader.process()
-        processed_results = self.content_analyzer.process_loaded_data(loaded_data)
-        return self.knowledge_processor.merge_analysis(processed_results)
+        if isinstance(loader, DocumentLoader):
+            # Stream documents so LLM analysis starts before loading finishes
+            processed_results = await self.content_analyzer.aanalyze_document_stream(
+                loader.iter_documents()
+            )
+        else:
+            loaded_data = loader.process()
+            processed_results = await self.content_analyzer.aprocess_loaded_data(
+                loaded_data
+            )
+        return await self.knowledge_processor.amerge_analysis(processed_results)
 
     def run(self, sources: List[SourceConfig]):
         """Process multiple sources and merge results"""
+        return asyncio.run(self.arun(sources))
+
+    async def arun(self, sources: List[SourceConfig]):
+        """Async counterpart of run, processing every source on one event loop"""
         for source_config in sources:
-            self.process_source(source_config)
+            await self.aprocess_source(source_config)
         return self.knowledge_processor.get_knowledge_graph()
 
 
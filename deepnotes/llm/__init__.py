@@ -1 +1,2 @@
+from .llm_cache import CachedLLM
 from .llm_wrapper import LLMResponse, LLMWrapper
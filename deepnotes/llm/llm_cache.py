@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from pydantic import BaseModel
+
+from deepnotes.llm.llm_wrapper import LLMResponse, LLMWrapper
+
+
+class CachedLLM:
+    """LLM wrapper caching completions by exact prompt match
+
+    Completions are kept in an in-memory LRU and, when a cache path is given,
+    persisted to SQLite so re-runs over unchanged content skip the LLM call.
+    """
+
+    def __init__(
+        self,
+        llm: LLMWrapper,
+        cache_path: Optional[str] = None,
+        max_memory_items: int = 1024,
+    ):
+        self.llm = llm
+        self.config = llm.config
+        self.max_memory_items = max_memory_items
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._db = None
+        if cache_path:
+            cache_path = os.path.expanduser(cache_path)
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, content TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def generate(
+        self,
+        prompt: str,
+        parse_json: bool = True,
+        response_model: Optional[type[BaseModel]] = None,
+        routing_key: Optional[str] = None,
+    ) -> LLMResponse:
+        """Generate response, serving repeated prompts from the cache"""
+        key = self._cache_key(prompt, parse_json, response_model)
+        content = self._get(key)
+        if content is not None:
+            return self._cached_response(content, response_model)
+
+        response = self.llm.generate(
+            prompt,
+            parse_json=parse_json,
+            response_model=response_model,
+            routing_key=routing_key,
+        )
+        self._set(key, response.content)
+        return response
+
+    async def agenerate(
+        self,
+        prompt: str,
+        parse_json: bool = True,
+        response_model: Optional[type[BaseModel]] = None,
+        routing_key: Optional[str] = None,
+    ) -> LLMResponse:
+        """Async counterpart of generate"""
+        key = self._cache_key(prompt, parse_json, response_model)
+        content = await self._run_io(self._get, key)
+        if content is not None:
+            return self._cached_response(content, response_model)
+
+        response = await self.llm.agenerate(
+            prompt,
+            parse_json=parse_json,
+            response_model=response_model,
+            routing_key=routing_key,
+        )
+        await self._run_io(self._set, key, response.content)
+        return response
+
+    async def _run_io(self, func, *args):
+        """
+        Run a cache access in a worker thread when it may hit SQLite, so disk reads
+        and commits don't stall other requests on the event loop
+        """
+        if self._db is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counts since creation and current in-memory size"""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "memory_items": len(self._memory),
+            }
+
+    def _cached_response(
+        self, content: str, response_model: Optional[type[BaseModel]]
+    ) -> LLMResponse:
+        return LLMResponse(
+            content=content,
+            provider=self.config.provider,
+            model=self.config.model,
+            input_tokens=0,
+            output_tokens=0,
+            model_instance=response_model.model_validate_json(content)
+            if response_model
+            else None,
+        )
+
+    def _cache_key(
+        self,
+        prompt: str,
+        parse_json: bool,
+        response_model: Optional[type[BaseModel]],
+    ) -> str:
+        model_name = response_model.__name__ if response_model else ""
+        raw = "\0".join(
+            [
+                self.config.provider,
+                self.config.model,
+                # The language selects the system prompt sent with every request
+                self.config.language,
+                model_name,
+                str(parse_json),
+                prompt,
+            ]
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._hits += 1
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            row = None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT content FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def _set(self, key: str, content: str):
+        with self._lock:
+            self._remember(key, content)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, content) VALUES (?, ?)",
+                    (key, content),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, content: str):
+        self._memory[key] = content
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
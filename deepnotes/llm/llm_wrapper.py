@@ -1,9 +1,19 @@
+import asyncio
+import hashlib
 import os
 import time
+import weakref
 from typing import Optional
 
 from dotenv import load_dotenv
-from openai import APIError, AzureOpenAI, OpenAI, RateLimitError
+from openai import (
+    APIError,
+    AsyncAzureOpenAI,
+    AsyncOpenAI,
+    AzureOpenAI,
+    OpenAI,
+    RateLimitError,
+)
 from openai.types.chat import ChatCompletion
 from pydantic import BaseModel, Field
 
@@ -41,28 +51,77 @@ class LLMConfig(BaseModel):
         default="english", description="Output language for responses"
     )
     concurrency: Optional[dict] = None  # Add concurrency config
+    replica_urls: Optional[list[str]] = Field(
+        default=None,
+        description="Base URLs of server replicas; requests sharing a routing key go to the same one",
+    )
 
 
 class LLMWrapper:
     def __init__(self, config: LLMConfig):
         self.config = config
         self.client = self._create_client()
+        # Sync replica clients keyed by replica index, created on first use
+        self._replica_clients = {}
+        # Async clients keyed by event loop, then by replica index (None for the
+        # primary). Their connection pools belong to the loop that created them,
+        # so each asyncio.run gets its own and they are dropped with the loop.
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def async_client(self):
+        """Async client for the running event loop, created on first use"""
+        return self._get_async_client(None)
+
+    def _get_async_client(self, idx: Optional[int]):
+        """Async client bound to the running event loop for a replica index"""
+        clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+        if idx not in clients:
+            base_url = None if idx is None else self.config.replica_urls[idx]
+            clients[idx] = self._create_client(use_async=True, base_url=base_url)
+        return clients[idx]
+
+    def _get_client(self, routing_key: Optional[str], use_async: bool = False):
+        """
+        Pick the client for a request. Requests with the same routing key (e.g. the
+        document being analyzed) are pinned to one replica so its prefix cache is
+        reused.
+        """
+        if not self.config.replica_urls or routing_key is None:
+            return self.async_client if use_async else self.client
+        # crc32 is linear, so keys differing in a few bits (e.g. doc1.md, doc2.md)
+        # share its low bits and would pile onto one replica; blake2b mixes them
+        digest = hashlib.blake2b(routing_key.encode("utf-8"), digest_size=8).digest()
+        idx = int.from_bytes(digest, "big") % len(self.config.replica_urls)
+        if use_async:
+            return self._get_async_client(idx)
+        if idx not in self._replica_clients:
+            self._replica_clients[idx] = self._create_client(
+                base_url=self.config.replica_urls[idx]
+            )
+        return self._replica_clients[idx]
 
-    def _create_client(self):
+    def _create_client(self, use_async: bool = False, base_url: Optional[str] = None):
         """Initialize client for OpenAI-compatible providers"""
         client_params = {
             "api_key": self.config.api_key,
         }
 
         # Set base URL for compatible providers
-        if self.config.provider != "openai":
+        if base_url:
+            client_params["base_url"] = base_url
+        elif self.config.provider != "openai":
             client_params["base_url"] = self.config.base_url
 
         # Special handling for Azure
         if self.config.provider == "azure":
             client_params["api_version"] = self.config.api_version
+            if use_async:
+                return AsyncAzureOpenAI(**client_params)
             return AzureOpenAI(**client_params)
 
+        if use_async:
+            return AsyncOpenAI(**client_params)
         return OpenAI(**client_params)
 
     def generate(
@@ -70,25 +129,44 @@ class LLMWrapper:
         prompt: str,
         parse_json: bool = True,
         response_model: Optional[type[BaseModel]] = None,
+        routing_key: Optional[str] = None,
     ) -> LLMResponse:
         """Generate response with automatic validation and self-correction"""
-        original_response = self._generate_with_retry(prompt, parse_json)
+        original_response = self._generate_with_retry(prompt, parse_json, routing_key)
 
         if response_model:
             try:
-                instance = response_model.model_validate_json(original_response.content)
-                return LLMResponse(
-                    content=original_response.content,
-                    provider=original_response.provider,
-                    model=original_response.model,
-                    input_tokens=original_response.input_tokens,
-                    output_tokens=original_response.output_tokens,
-                    model_instance=instance,
-                )
+                return self._validate_response(original_response, response_model)
             except Exception as e:
                 print(f"Validation error: {str(e)}. Attempting self-correction...")
                 corrected_response = self._correct_and_validate(
-                    prompt, original_response.content, e, response_model
+                    prompt, original_response.content, e, response_model, routing_key
+                )
+                corrected_response.input_tokens += original_response.input_tokens
+                corrected_response.output_tokens += original_response.output_tokens
+                return corrected_response
+
+        return original_response
+
+    async def agenerate(
+        self,
+        prompt: str,
+        parse_json: bool = True,
+        response_model: Optional[type[BaseModel]] = None,
+        routing_key: Optional[str] = None,
+    ) -> LLMResponse:
+        """Async counterpart of generate for running many requests concurrently"""
+        original_response = await self._agenerate_with_retry(
+            prompt, parse_json, routing_key
+        )
+
+        if response_model:
+            try:
+                return self._validate_response(original_response, response_model)
+            except Exception as e:
+                print(f"Validation error: {str(e)}. Attempting self-correction...")
+                corrected_response = await self._acorrect_and_validate(
+                    prompt, original_response.content, e, response_model, routing_key
                 )
                 corrected_response.input_tokens += original_response.input_tokens
                 corrected_response.output_tokens += original_response.output_tokens
@@ -96,55 +174,104 @@ class LLMWrapper:
 
         return original_response
 
-    def _generate_with_retry(self, prompt: str, parse_json: bool) -> LLMResponse | None:
+    @staticmethod
+    def _validate_response(
+        response: LLMResponse, response_model: type[BaseModel]
+    ) -> LLMResponse:
+        """Attach the validated response model instance to a raw response"""
+        instance = response_model.model_validate_json(response.content)
+        return LLMResponse(
+            content=response.content,
+            provider=response.provider,
+            model=response.model,
+            input_tokens=response.input_tokens,
+            output_tokens=response.output_tokens,
+            model_instance=instance,
+        )
+
+    def _build_messages(self, prompt: str) -> list[dict]:
+        """Build chat messages with language-adapted system prompt"""
+        # Modified system prompt with language adaptation
+        if self.config.language.lower() == "chinese":
+            system_content = "你是一个全能助手，能够理解所有语言，但请始终使用中文回答。你的回答必须使用中文，并保持简洁准确。"
+        else:
+            system_content = f"You are a helpful assistant who understands all languages. Please respond in {self.config.language} using clear and natural expressions."
+
+        return [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": prompt},
+        ]
+
+    def _parse_completion(
+        self, response: ChatCompletion, parse_json: bool
+    ) -> LLMResponse:
+        """Convert chat completion into LLMResponse"""
+        response_content = response.choices[0].message.content
+        input_tokens = response.usage.prompt_tokens
+        output_tokens = response.usage.completion_tokens
+
+        # Original non-streaming handling
+        if "</think>" in response_content and "<think>" in response_content:
+            response_content = response_content.split("</think>")[1]
+
+        if parse_json and response_content.strip().startswith("```"):
+            response_content = self._extract_json_from_markdown(
+                response_content.strip()
+            )
+
+        return LLMResponse(
+            content=response_content,
+            provider=self.config.provider,
+            model=self.config.model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+    def _generate_with_retry(
+        self, prompt: str, parse_json: bool, routing_key: Optional[str] = None
+    ) -> LLMResponse | None:
         """Base generation method with retry logic"""
         max_retries = 5
         backoff_factor = 1.5
         for attempt in range(max_retries):
             try:
-                # Modified system prompt with language adaptation
-                if self.config.language.lower() == "chinese":
-                    system_content = "你是一个全能助手，能够理解所有语言，但请始终使用中文回答。你的回答必须使用中文，并保持简洁准确。"
-                else:
-                    system_content = f"You are a helpful assistant who understands all languages. Please respond in {self.config.language} using clear and natural expressions."
-
-                messages = [
-                    {"role": "system", "content": system_content},
-                    {"role": "user", "content": prompt},
-                ]
-
-                response: ChatCompletion = self.client.chat.completions.create(
+                client = self._get_client(routing_key)
+                response: ChatCompletion = client.chat.completions.create(
                     model=self.config.model,
-                    messages=messages,
+                    messages=self._build_messages(prompt),
                 )
+                return self._parse_completion(response, parse_json)
+            except RateLimitError:
+                if attempt >= max_retries - 1:
+                    raise
+                sleep_time = backoff_factor**attempt
+                print(f"Rate limited, retrying in {sleep_time:.1f}s...")
+                time.sleep(sleep_time)
+            except APIError as e:
+                if e.status_code == 502 and attempt < max_retries - 1:
+                    continue  # Retry on bad gateway
+                raise
 
-                # Handle streaming response
-                response_content = response.choices[0].message.content
-                input_tokens = response.usage.prompt_tokens
-                output_tokens = response.usage.completion_tokens
-
-                # Original non-streaming handling
-                if "</think>" in response_content and "<think>" in response_content:
-                    response_content = response_content.split("</think>")[1]
-
-                if parse_json and response_content.strip().startswith("```"):
-                    response_content = self._extract_json_from_markdown(
-                        response_content.strip()
-                    )
-
-                return LLMResponse(
-                    content=response_content,
-                    provider=self.config.provider,
+    async def _agenerate_with_retry(
+        self, prompt: str, parse_json: bool, routing_key: Optional[str] = None
+    ) -> LLMResponse | None:
+        """Async base generation method with retry logic"""
+        max_retries = 5
+        backoff_factor = 1.5
+        for attempt in range(max_retries):
+            try:
+                client = self._get_client(routing_key, use_async=True)
+                response: ChatCompletion = await client.chat.completions.create(
                     model=self.config.model,
-                    input_tokens=input_tokens,
-                    output_tokens=output_tokens,
+                    messages=self._build_messages(prompt),
                 )
+                return self._parse_completion(response, parse_json)
             except RateLimitError:
                 if attempt >= max_retries - 1:
                     raise
                 sleep_time = backoff_factor**attempt
                 print(f"Rate limited, retrying in {sleep_time:.1f}s...")
-                time.sleep(sleep_time)
+                await asyncio.sleep(sleep_time)
             except APIError as e:
                 if e.status_code == 502 and attempt < max_retries - 1:
                     continue  # Retry on bad gateway
@@ -156,6 +283,7 @@ class LLMWrapper:
         invalid_json: str,
         error: Exception,
         response_model: type[BaseModel],
+        routing_key: Optional[str] = None,
         max_retries: int = 3,
         previous_errors: list[str] = None,
     ) -> LLMResponse:
@@ -168,45 +296,86 @@ class LLMWrapper:
                 "Max retries exceeded. Errors:\n" + "\n".join(previous_errors)
             )
 
-        error_history = "\n".join(
-            [f"Attempt {i + 1}: {e}" for i, e in enumerate(previous_errors)]
+        correction_prompt = self._build_correction_prompt(
+            original_prompt, previous_errors
+        )
+        corrected_response = self._generate_with_retry(
+            correction_prompt, parse_json=True, routing_key=routing_key
         )
 
-        correction_prompt = f"""
-        JSON validation failed multiple times. Error history:
-        {error_history}
+        try:
+            return self._validate_response(corrected_response, response_model)
+        except Exception as e:
+            print(f"Correction failed (attempts left: {max_retries - 1}), retrying...")
+            return self._correct_and_validate(
+                original_prompt,
+                corrected_response.content,
+                e,
+                response_model,
+                routing_key,
+                max_retries - 1,
+                previous_errors,
+            )
 
-        Original prompt: {original_prompt}
+    async def _acorrect_and_validate(
+        self,
+        original_prompt: str,
+        invalid_json: str,
+        error: Exception,
+        response_model: type[BaseModel],
+        routing_key: Optional[str] = None,
+        max_retries: int = 3,
+        previous_errors: list[str] = None,
+    ) -> LLMResponse:
+        """Async counterpart of _correct_and_validate"""
+        previous_errors = previous_errors or []
+        previous_errors.append(f"Error: {str(error)}\nInvalid JSON: {invalid_json}")
 
-        Please carefully correct the JSON to match the required schema.
-        Respond ONLY with the corrected JSON between ```json markers.
-        """
+        if max_retries <= 0:
+            raise ValueError(
+                "Max retries exceeded. Errors:\n" + "\n".join(previous_errors)
+            )
 
-        corrected_response = self._generate_with_retry(
-            correction_prompt, parse_json=True
+        correction_prompt = self._build_correction_prompt(
+            original_prompt, previous_errors
+        )
+        corrected_response = await self._agenerate_with_retry(
+            correction_prompt, parse_json=True, routing_key=routing_key
         )
 
         try:
-            instance = response_model.model_validate_json(corrected_response.content)
-            return LLMResponse(
-                content=corrected_response.content,
-                provider=corrected_response.provider,
-                model=corrected_response.model,
-                input_tokens=corrected_response.input_tokens,
-                output_tokens=corrected_response.output_tokens,
-                model_instance=instance,
-            )
+            return self._validate_response(corrected_response, response_model)
         except Exception as e:
             print(f"Correction failed (attempts left: {max_retries - 1}), retrying...")
-            return self._correct_and_validate(
+            return await self._acorrect_and_validate(
                 original_prompt,
                 corrected_response.content,
                 e,
                 response_model,
+                routing_key,
                 max_retries - 1,
                 previous_errors,
             )
 
+    @staticmethod
+    def _build_correction_prompt(
+        original_prompt: str, previous_errors: list[str]
+    ) -> str:
+        """Build JSON correction prompt from error history"""
+        error_history = "\n".join(
+            [f"Attempt {i + 1}: {e}" for i, e in enumerate(previous_errors)]
+        )
+
+        return f"""
+        JSON validation failed multiple times. Error history:
+        {error_history}
+
+        Original prompt: {original_prompt}
+
+        Please carefully correct the JSON to match the required schema.
+        Respond ONLY with the corrected JSON between ```json markers.
+        """
+
     @staticmethod
     def _extract_json_from_markdown(markdown_text: str) -> str:
         """
@@ -239,6 +408,7 @@ def get_llm_model(provider: str = None, model: str = None) -> LLMWrapper:
                 f"{provider.upper()}_API_KEY", provider_config.get("api_key")
             ),
             api_version=provider_config.get("api_version"),
+            replica_urls=provider_config.get("replica_urls"),
         )
     else:
         raise ValueError("Provider and model must be specified or set as default.")
@@ -1,5 +1,7 @@
 import os
-from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
 
 from deepnotes.loaders.base_loader import BaseLoader
 from deepnotes.models.loader_models import (
@@ -101,21 +103,8 @@ class DocumentLoader(BaseLoader):
         if not target_path:
             target_path = self.config.connection["path"]
 
-        if not os.path.exists(target_path):
-            raise FileNotFoundError(f"Path not found: {target_path}")
-
-        loaded_docs = []
-        file_types = set()
-
-        if os.path.isdir(target_path):
-            for root, _, files in os.walk(target_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    loaded_docs.append(self._process_single_file(file_path))
-                    file_types.add(os.path.splitext(file)[1].lower())
-        else:
-            loaded_docs.append(self._process_single_file(target_path))
-            file_types.add(os.path.splitext(target_path)[1].lower())
+        loaded_docs = list(self.iter_documents(target_path=target_path))
+        file_types = {d.metadata.file_type for d in loaded_docs}
 
         return DocumentLoadedData(
             source_type=SourceType.DOCUMENT,
@@ -127,6 +116,54 @@ class DocumentLoader(BaseLoader):
             documents=loaded_docs,
         )
 
+    def iter_documents(
+        self, *, target_path: Optional[str] = None
+    ) -> Iterator[ProcessedDocument]:
+        """Lazily load and chunk each file of a file or directory"""
+        if not target_path:
+            target_path = self.config.connection["path"]
+
+        if not os.path.exists(target_path):
+            raise FileNotFoundError(f"Path not found: {target_path}")
+
+        if os.path.isdir(target_path):
+            file_paths = self._iter_files(
+                target_path, self.config.options.get("walk_concurrency", 16)
+            )
+        else:
+            file_paths = [target_path]
+
+        for file_path in file_paths:
+            yield self._process_single_file(file_path)
+
+    @classmethod
+    def _iter_files(cls, path: str, max_workers: int = 16) -> Iterator[str]:
+        """
+        Lazily yield file paths under a directory. Subdirectories are scanned
+        concurrently in a thread pool, which hides per-directory latency on slow
+        or networked filesystems; paths are yielded breadth-first.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque([pool.submit(cls._scan_dir, path)])
+            while pending:
+                files, dirs = pending.popleft().result()
+                pending.extend(pool.submit(cls._scan_dir, d) for d in dirs)
+                yield from files
+
+    @staticmethod
+    def _scan_dir(path: str) -> tuple[list[str], list[str]]:
+        """List the files and subdirectories of a single directory"""
+        files, dirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # Symlinked files are read like os.walk does; symlinked directories
+                # are not descended into, which keeps the walk free of cycles
+                if entry.is_file():
+                    files.append(entry.path)
+                elif entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+        return files, dirs
+
     def _process_single_file(self, file_path: str) -> ProcessedDocument:
         """Process individual file and return structured data"""
         if not os.path.exists(file_path):
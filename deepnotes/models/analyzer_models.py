@@ -1,9 +1,44 @@
-from typing import Any, Dict, List, Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
 
-class Entity(BaseModel):
+class _JsonCachedModel(BaseModel):
+    """
+    Model reusing its serialized JSON until a field is reassigned or the model is
+    copied. Dict fields must be reassigned rather than mutated in place.
+    """
+
+    _json_cache: Optional[str] = PrivateAttr(default=None)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name != "_json_cache":
+            self._json_cache = None
+
+    def model_copy(self, *, update=None, deep=False):
+        copied = super().model_copy(update=update, deep=deep)
+        copied._json_cache = None
+        return copied
+
+    def __eq__(self, other):
+        # Compare field values only so a populated JSON cache doesn't affect equality
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(
+            self.__dict__.get(name) == other.__dict__.get(name)
+            for name in type(self).model_fields
+        )
+
+    def cached_json(self) -> str:
+        if self._json_cache is None:
+            self._json_cache = self.model_dump_json()
+        return self._json_cache
+
+
+class Entity(_JsonCachedModel):
+    model_config = ConfigDict(defer_build=True)
+
     id: str = Field(
         description="Unique identifier for the entity. Naming convention: snake_case of entity name"
     )
@@ -14,37 +49,53 @@ class Entity(BaseModel):
     type: str = Field(
         description="Type of the entity (e.g., 'concept', 'company', etc.)"
     )
-    attributes: Optional[Dict[str, Any]] = Field(
+    attributes: Optional[dict] = Field(
         default_factory=dict, description="Additional attributes"
     )
-    metadata: Optional[Dict[str, Any]] = Field(
-        default_factory=dict, description="Metadata"
-    )
+    metadata: Optional[dict] = Field(default_factory=dict, description="Metadata")
 
 
-class Relationship(BaseModel):
+class Relationship(_JsonCachedModel):
     """Represents a connection between two DataEntities"""
 
+    # Frozen so the derived id can never go stale after construction
+    model_config = ConfigDict(defer_build=True, frozen=True)
+
     source: str = Field(description="ID of source entity")
     target: str = Field(description="ID of target entity")
     type: str = Field(
         description="Relationship type (e.g., 'belongs_to', 'depends_on')"
     )
-    attributes: Optional[Dict[str, Any]] = Field(
+    attributes: Optional[dict] = Field(
         default_factory=dict, description="Additional attributes"
     )
-    metadata: Optional[Dict[str, str]] = Field(
-        default_factory=dict, description="Metadata"
-    )
+    metadata: Optional[dict] = Field(default_factory=dict, description="Metadata")
+
+    # Kept out of the field values so dict(rel) and iteration only yield fields
+    _id: str = PrivateAttr()
+
+    def model_post_init(self, __context):
+        self._id = f"{self.source}__{self.type}__{self.target}"
+
+    def model_copy(self, *, update=None, deep=False):
+        # model_copy skips model_post_init, so derive the id from the copied fields
+        copied = super().model_copy(update=update, deep=deep)
+        copied.model_post_init(None)
+        return copied
 
     @property
-    def id(self):
-        return f"{self.source}__{self.type}__{self.target}"
+    def id(self) -> str:
+        return self._id
+
+    def __hash__(self):
+        return hash(self.id)
 
 
 class KnowledgeGraph(BaseModel):
     """Knowledge graph representation"""
 
+    model_config = ConfigDict(defer_build=True)
+
     entities: List[Entity] = Field(default_factory=list)
     relationships: List[Relationship] = Field(default_factory=list)
 
@@ -52,6 +103,8 @@ class KnowledgeGraph(BaseModel):
 class ChunkAnalysisResult(BaseModel):
     """Analysis result for each chunk of the target item"""
 
+    model_config = ConfigDict(defer_build=True, frozen=True)
+
     chunk_index: Optional[int] = Field(
         default=None, description="Index of the chunk in the document"
     )
@@ -66,9 +119,31 @@ class ChunkAnalysisResult(BaseModel):
     )
 
 
+class ChunkBatchAnalysisResult(BaseModel):
+    """Analysis results for a batch of chunks analyzed in a single request"""
+
+    model_config = ConfigDict(defer_build=True)
+
+    results: List[ChunkAnalysisResult] = Field(
+        default_factory=list, description="Analysis result for each chunk, in order"
+    )
+
+
+class EntityBatchResolutionResult(BaseModel):
+    """Merged entities for a batch of conflicts resolved in a single request"""
+
+    model_config = ConfigDict(defer_build=True)
+
+    entities: List[Entity] = Field(
+        default_factory=list, description="Merged entity for each conflict, in order"
+    )
+
+
 class ConsolidationAnalysisResult(BaseModel):
     """Consolidation analysis result of the target item"""
 
+    model_config = ConfigDict(defer_build=True)
+
     knowledge_graph: Optional[KnowledgeGraph] = Field(
         default=None, description="Knowledge graph of the target item"
     )
@@ -76,6 +151,4 @@ class ConsolidationAnalysisResult(BaseModel):
         default=None,
         description="Overall document summary. Should be comprehensive and provide an overview of the target item.",
     )
-    metadata: Dict[str, Any] = Field(
-        default_factory=dict, description="Metadata information"
-    )
+    metadata: dict = Field(default_factory=dict, description="Metadata information")
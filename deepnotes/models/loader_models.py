@@ -1,8 +1,8 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
-from deepnotes.models.source_models import SourceType
+from deepnotes.models.source_models import SourceTypeLiteral
 
 
 class FileMetadata(BaseModel):
@@ -40,9 +40,11 @@ class TableSchema(BaseModel):
 class DocumentChunk(BaseModel):
     """Document chunk with its text content"""
 
+    model_config = ConfigDict(defer_build=True)
+
     text: str
     index: int
-    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    metadata: Optional[dict] = Field(default_factory=dict)
 
 
 class ProcessedDocument(BaseModel):
@@ -56,8 +58,8 @@ class ProcessedDocument(BaseModel):
 class LoadedData(BaseModel):
     """Base class for all loaded data"""
 
-    source_type: SourceType
-    global_metadata: Dict[str, Any] = Field(
+    source_type: SourceTypeLiteral
+    global_metadata: dict = Field(
         default_factory=dict, description="Common metadata across all loaded content"
     )
     data_type: str = Field(
@@ -71,25 +73,23 @@ class DocumentLoadedData(LoadedData):
     documents: List[ProcessedDocument] = Field(
         ..., description="List of processed documents with chunks and metadata"
     )
-    data_type: str = Field(default="documents", frozen=True)
+    data_type: Literal["documents"] = Field(default="documents", frozen=True)
 
 
 class CodebaseLoadedData(LoadedData):
     """Structured codebase analysis results"""
 
-    files: List[Dict[str, Any]] = Field(
-        ..., description="List of code files with analyses"
-    )
+    files: List[CodeFile] = Field(..., description="List of code files with analyses")
     dependencies: List[str] = Field(
         default_factory=list, description="Discovered package dependencies"
     )
-    data_type: str = Field(default="codebase", frozen=True)
+    data_type: Literal["codebase"] = Field(default="codebase", frozen=True)
 
 
 class DatabaseLoadedData(LoadedData):
     """Structured database schema information"""
 
-    tables: List[Dict[str, Any]] = Field(
+    tables: List[TableSchema] = Field(
         ..., description="List of tables with schema and samples"
     )
-    data_type: str = Field(default="database", frozen=True)
+    data_type: Literal["database"] = Field(default="database", frozen=True)
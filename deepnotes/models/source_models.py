@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -11,8 +11,14 @@ class SourceType(str, Enum):
     WEB_DOCUMENT = "web_document"
     API = "api"
 
+
+# Literal counterpart of SourceType used for model fields; validates faster than
+# the Enum and still accepts SourceType members since they are str subclasses.
+SourceTypeLiteral = Literal["document", "database", "codebase", "web_document", "api"]
+
+
 class SourceConfig(BaseModel):
-    type: SourceType
+    type: SourceTypeLiteral
     name: str
     description: Optional[str] = None
     connection: Dict[str, Any] = Field(default_factory=dict)
@@ -1,24 +1,33 @@
+import asyncio
 import hashlib
-from asyncio import as_completed
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List
+import json
+from contextlib import nullcontext
+from functools import cache, lru_cache
+from typing import Iterable, List, Optional
 
 from tqdm import tqdm
 
+from deepnotes.config.config import get_config
+from deepnotes.llm.llm_cache import CachedLLM
 from deepnotes.llm.llm_wrapper import get_llm_model
 from deepnotes.loaders.document_loader import DocumentLoader
 from deepnotes.models.analyzer_models import (
     ChunkAnalysisResult,
+    ChunkBatchAnalysisResult,
     ConsolidationAnalysisResult,
     Entity,
     KnowledgeGraph,
     Relationship,
 )
 from deepnotes.models.loader_models import (
+    CodebaseLoadedData,
     CodeFile,
+    DatabaseLoadedData,
+    DocumentChunk,
     DocumentLoadedData,
     LoadedData,
     ProcessedDocument,
+    TableSchema,
 )
 from deepnotes.models.source_models import SourceConfig, SourceType
 from deepnotes.storage.document_storage import DocumentStore
@@ -29,8 +38,20 @@ class ContentAnalyzer:
         """
         Initializes the first-layer document processor.
         """
-        self.llm_model = get_llm_model()
         self.config = config or {}
+        llm_config = get_config()["llm"]
+        cache_path = self.config.get("llm_cache_path", llm_config.get("cache_path"))
+        self.llm_model = CachedLLM(get_llm_model(), cache_path)
+        # Chunk-level extraction is simpler than consolidation, so it may use a
+        # smaller (e.g. quantized) model; defaults to the main model
+        chunk_provider = self.config.get("chunk_provider", llm_config.get("chunk_provider"))
+        chunk_model = self.config.get("chunk_model", llm_config.get("chunk_model"))
+        if chunk_provider or chunk_model:
+            self.chunk_llm_model = CachedLLM(
+                get_llm_model(chunk_provider, chunk_model), cache_path
+            )
+        else:
+            self.chunk_llm_model = self.llm_model
 
         # Get chunking config with defaults
         chunk_config = self.config.get("text_processing", {})
@@ -52,6 +73,15 @@ class ContentAnalyzer:
         self.chunk_concurrency = self.config.get(
             "chunk_processing", 4,
         )
+        # Number of chunks analyzed together in a single LLM request
+        self.chunk_batch_size = self.config.get("chunk_batch_size", 8)
+        # Max chunk results consolidated per LLM request before reducing hierarchically
+        self.consolidation_fan_in = self.config.get("consolidation_fan_in", 20)
+        if self.consolidation_fan_in < 2:
+            # Buckets of one result never shrink, so the reduction would not end
+            raise ValueError(
+                f"consolidation_fan_in must be at least 2, got {self.consolidation_fan_in}"
+            )
 
         self.document_store = DocumentStore(
             self.config.get("database_uri", "sqlite:///deepnotes.db")
@@ -63,12 +93,17 @@ class ContentAnalyzer:
         self, data: LoadedData
     ) -> List[ConsolidationAnalysisResult]:
         """Route processing based on data type"""
-        if data.data_type == "documents":
-            doc_data = DocumentLoadedData(**data.model_dump())
-            return self._analyze_documents(doc_data.documents)
-        elif data.data_type == "codebase":
+        return asyncio.run(self.aprocess_loaded_data(data))
+
+    async def aprocess_loaded_data(
+        self, data: LoadedData
+    ) -> List[ConsolidationAnalysisResult]:
+        """Async counterpart of process_loaded_data"""
+        if isinstance(data, DocumentLoadedData):
+            return await self._analyze_documents_async(data.documents)
+        elif isinstance(data, CodebaseLoadedData):
             return self._analyze_codebase(data.files, data.dependencies)
-        elif data.data_type == "database":
+        elif isinstance(data, DatabaseLoadedData):
             return self._analyze_database(data.tables)
         return []
 
@@ -81,8 +116,86 @@ class ContentAnalyzer:
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
 
-    def _consolidate_results(
-        self, chunk_analysis_results: List[ChunkAnalysisResult]
+    async def _consolidate_results(
+        self,
+        chunk_analysis_results: List[ChunkAnalysisResult],
+        semaphore: Optional[asyncio.Semaphore] = None,
+        routing_key: Optional[str] = None,
+    ) -> ConsolidationAnalysisResult | None:
+        """
+        Consolidate chunk results, reducing them in buckets of consolidation_fan_in
+        when they do not fit a single request. Bucket results are consolidated
+        concurrently, their summaries reduced recursively, and their knowledge graphs
+        merged into the final result.
+        """
+        if len(chunk_analysis_results) <= self.consolidation_fan_in:
+            async with semaphore or nullcontext():
+                return await self._consolidate_leaf(chunk_analysis_results, routing_key)
+
+        buckets = [
+            chunk_analysis_results[i:i + self.consolidation_fan_in]
+            for i in range(0, len(chunk_analysis_results), self.consolidation_fan_in)
+        ]
+        partials = await asyncio.gather(
+            *(
+                self._consolidate_results(bucket, semaphore, routing_key)
+                for bucket in buckets
+            )
+        )
+        partials = [p for p in partials if p]
+        if not partials:
+            return None
+
+        partial_summaries = [
+            ChunkAnalysisResult(
+                chunk_index=idx,
+                summary=partial.summary,
+                key_entities=[e.name for e in partial.knowledge_graph.entities]
+                if partial.knowledge_graph
+                else [],
+            )
+            for idx, partial in enumerate(partials)
+        ]
+        result = await self._consolidate_results(
+            partial_summaries, semaphore, routing_key
+        )
+        if result is None:
+            return None
+        return result.model_copy(
+            update={
+                "knowledge_graph": self._merge_knowledge_graphs(
+                    [p.knowledge_graph for p in [result, *partials] if p.knowledge_graph]
+                )
+            }
+        )
+
+    @staticmethod
+    def _merge_knowledge_graphs(graphs: List[KnowledgeGraph]) -> KnowledgeGraph:
+        """Union knowledge graphs, keeping the first entity or relationship per id"""
+        entities = {}
+        relationships = {}
+        for graph in graphs:
+            for entity in graph.entities:
+                entities.setdefault(entity.id, entity)
+            for rel in graph.relationships:
+                relationships.setdefault(rel.id, rel)
+        return KnowledgeGraph(
+            entities=list(entities.values()), relationships=list(relationships.values())
+        )
+
+    @staticmethod
+    def _group_identical_chunks(chunks: List[DocumentChunk]) -> List[List[DocumentChunk]]:
+        """Group chunks by content hash, in order of first occurrence"""
+        groups = {}
+        for chunk in chunks:
+            digest = hashlib.blake2b(chunk.text.encode("utf-8"), digest_size=16).digest()
+            groups.setdefault(digest, []).append(chunk)
+        return list(groups.values())
+
+    async def _consolidate_leaf(
+        self,
+        chunk_analysis_results: List[ChunkAnalysisResult],
+        routing_key: Optional[str] = None,
     ) -> ConsolidationAnalysisResult | None:
         """
         Process chunk-level intermediate data list for data consolidation and final output generation (comprehensive summary).
@@ -99,32 +212,52 @@ class ContentAnalyzer:
         prompt = self._create_consolidation_prompt(chunk_analysis_results)
 
         # Initialize progress with chunk count
-        llm_response = self.llm_model.generate(
+        llm_response = await self.llm_model.agenerate(
             prompt,
             response_model=ConsolidationAnalysisResult,
+            routing_key=routing_key,
         )
         result = llm_response.model_instance
 
         return result
 
     @staticmethod
-    def _create_chunk_analysis_prompt(chunk_content, chunk_index):
+    @cache
+    def _prompt_prefix_hash() -> str:
+        """Fingerprint of the static prompt prefixes"""
+        prefixes = (
+            ContentAnalyzer._chunk_analysis_prompt_prefix(),
+            ContentAnalyzer._chunk_batch_analysis_prompt_prefix(),
+            ContentAnalyzer._consolidation_prompt_prefix(),
+        )
+        return hashlib.blake2b(
+            "\0".join(prefixes).encode("utf-8"), digest_size=8
+        ).hexdigest()
+
+    @staticmethod
+    def _document_routing_key(document: ProcessedDocument) -> str:
         """
-        Construct chunk analysis prompt (example)
+        Routing key pinning all requests for a document to one server replica, so
+        the replica reuses its cached prompt prefixes while other documents spread
+        over the remaining replicas
         """
-        prompt_template = f"""Analyze the content of the following document chunk (chunk {
-            chunk_index
-        }) and extract the following information in JSON format:
+        return f"{ContentAnalyzer._prompt_prefix_hash()}:{document.metadata.file_path}"
+
+    @staticmethod
+    @cache
+    def _chunk_analysis_prompt_prefix() -> str:
+        """
+        Static head of the chunk analysis prompt, built once and placed before the
+        chunk content so providers can reuse their cached prompt prefix
+        """
+        return f"""Analyze the content of the document chunk given at the end and extract the following information in JSON format:
         - Chunk index
         - Concise summary (under 500 words)
         - Core topics
         - Key entities
 
-        Document chunk content:
-        {chunk_content}
-
         Output JSON Schema:
-        {ChunkAnalysisResult.model_json_schema()}
+        {json.dumps(ChunkAnalysisResult.model_json_schema())}
 
         Output JSON Example:
         {
@@ -136,15 +269,81 @@ class ContentAnalyzer:
             ).model_dump_json()
         }
         """
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _create_chunk_analysis_prompt(chunk_content, chunk_index):
+        """
+        Construct chunk analysis prompt (example)
+
+        Cached so repeated chunks (e.g. boilerplate headers) are formatted once.
+        """
+        prompt_template = f"""{ContentAnalyzer._chunk_analysis_prompt_prefix()}
+        Document chunk content (chunk {chunk_index}):
+        {chunk_content}
+        """
         return prompt_template
 
     @staticmethod
-    def _create_consolidation_prompt(chunk_analysis_results: List[ChunkAnalysisResult]):
+    @cache
+    def _chunk_batch_analysis_prompt_prefix() -> str:
         """
-        Construct document summary consolidation prompt (example)
+        Static head of the batched chunk analysis prompt
         """
-        prompt_template = f"""
-        Based on the summaries from multiple document chunks below, generate a comprehensive document analysis including:
+        return f"""Analyze each of the document chunks given at the end separately and extract the following information for every chunk in JSON format:
+        - Chunk index (as given in the chunk heading)
+        - Concise summary (under 500 words)
+        - Core topics
+        - Key entities
+
+        Return exactly one result per chunk, in the same order as the chunks.
+
+        Output JSON Schema:
+        {json.dumps(ChunkBatchAnalysisResult.model_json_schema())}
+
+        Output JSON Example:
+        {
+            ChunkBatchAnalysisResult(
+                results=[
+                    ChunkAnalysisResult(
+                        chunk_index=0,
+                        summary="This is a summary.",
+                        core_topics=["topic1", "topic2"],
+                        key_entities=["entity1", "entity2"],
+                    ),
+                    ChunkAnalysisResult(
+                        chunk_index=1,
+                        summary="This is another summary.",
+                        core_topics=["topic3"],
+                        key_entities=["entity3"],
+                    ),
+                ]
+            ).model_dump_json()
+        }
+        """
+
+    @staticmethod
+    def _create_chunk_batch_analysis_prompt(chunks: List[DocumentChunk]):
+        """
+        Construct analysis prompt covering multiple chunks (example)
+        """
+        chunks_content = "\n\n".join(
+            f"Chunk {chunk.index}:\n{chunk.text}" for chunk in chunks
+        )
+        prompt_template = f"""{ContentAnalyzer._chunk_batch_analysis_prompt_prefix()}
+        Document chunks:
+        {chunks_content}
+        """
+        return prompt_template
+
+    @staticmethod
+    @cache
+    def _consolidation_prompt_prefix() -> str:
+        """
+        Static head of the consolidation prompt
+        """
+        return f"""
+        Based on the summaries from multiple document chunks given at the end, generate a comprehensive document analysis including:
         - Overall summary
         - Knowledge graph structure
         - Metadata information
@@ -153,11 +352,8 @@ class ContentAnalyzer:
         1. Return results in JSON format.
         2. Entity ID should be meaningful and unique, following snake case format. E.g. "knowledge_graph", "deep_learning".
 
-        Document chunk information (in order):
-        {[data.model_dump_json() for data in chunk_analysis_results]}
-
         Output JSON Schema:
-        {ConsolidationAnalysisResult.model_json_schema()}
+        {json.dumps(ConsolidationAnalysisResult.model_json_schema())}
 
         Output JSON Example:
         {
@@ -187,25 +383,89 @@ class ContentAnalyzer:
             ).model_dump_json()
         }
         """
+
+    @staticmethod
+    def _create_consolidation_prompt(chunk_analysis_results: List[ChunkAnalysisResult]):
+        """
+        Construct document summary consolidation prompt (example)
+        """
+        # Topics and entities repeat across chunks, so list them once up front
+        # and keep only index and summary per chunk, in compact JSON
+        core_topics = list(
+            dict.fromkeys(t for data in chunk_analysis_results for t in data.core_topics)
+        )
+        key_entities = list(
+            dict.fromkeys(e for data in chunk_analysis_results for e in data.key_entities)
+        )
+        chunks_json = json.dumps(
+            [ContentAnalyzer._compact_chunk(data) for data in chunk_analysis_results],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        prompt_template = f"""{ContentAnalyzer._consolidation_prompt_prefix()}
+        Core topics across chunks: {json.dumps(core_topics, ensure_ascii=False)}
+        Key entities across chunks: {json.dumps(key_entities, ensure_ascii=False)}
+        Document chunk summaries (in order, "i" is chunk index and "s" is summary):
+        {chunks_json}
+        """
         return prompt_template
 
-    def _analyze_chunk(self, chunk_content: str, chunk_index: int) -> ChunkAnalysisResult:
+    @staticmethod
+    def _compact_chunk(data: ChunkAnalysisResult) -> dict:
+        """Reduce a chunk analysis result to its index and summary"""
+        return {"i": data.chunk_index, "s": data.summary}
+
+    async def _analyze_chunk(
+        self, chunk_content: str, chunk_index: int, routing_key: Optional[str] = None
+    ) -> ChunkAnalysisResult:
         """
         Analyze a single document chunk.
         """
         prompt = self._create_chunk_analysis_prompt(chunk_content, chunk_index)
-        llm_response = self.llm_model.generate(
-            prompt, response_model=ChunkAnalysisResult
+        llm_response = await self.chunk_llm_model.agenerate(
+            prompt,
+            response_model=ChunkAnalysisResult,
+            routing_key=routing_key,
         )
 
-        analysis_result = ChunkAnalysisResult(
-            **llm_response.model_instance.model_dump()
-        )
+        analysis_result = llm_response.model_instance
         if analysis_result.chunk_index is None:
-            analysis_result.chunk_index = chunk_index
+            analysis_result = analysis_result.model_copy(
+                update={"chunk_index": chunk_index}
+            )
 
         return analysis_result
 
+    async def _analyze_chunk_batch(
+        self, chunks: List[DocumentChunk], routing_key: Optional[str] = None
+    ) -> List[ChunkAnalysisResult]:
+        """
+        Analyze multiple document chunks with a single LLM request.
+        """
+        if len(chunks) == 1:
+            return [
+                await self._analyze_chunk(chunks[0].text, chunks[0].index, routing_key)
+            ]
+
+        prompt = self._create_chunk_batch_analysis_prompt(chunks)
+        llm_response = await self.chunk_llm_model.agenerate(
+            prompt,
+            response_model=ChunkBatchAnalysisResult,
+            routing_key=routing_key,
+        )
+        results_by_index = {
+            result.chunk_index: result
+            for result in llm_response.model_instance.results
+            if result.chunk_index is not None
+        }
+
+        # Fall back to single-chunk analysis for chunks missing from the response
+        return [
+            results_by_index.get(chunk.index)
+            or await self._analyze_chunk(chunk.text, chunk.index, routing_key)
+            for chunk in chunks
+        ]
+
     def _analyze_codebase(
         self, files: List[CodeFile], dependencies: List[str]
     ) -> List[ConsolidationAnalysisResult]:
@@ -213,30 +473,97 @@ class ContentAnalyzer:
         raise NotImplementedError("Codebase analysis not implemented yet")
 
     def _analyze_database(
-        self, tables: List[Dict]
+        self, tables: List[TableSchema]
     ) -> List[ConsolidationAnalysisResult]:
         """Analyze database schema and data patterns"""
         raise NotImplementedError("Database analysis not implemented yet")
 
+    def analyze_document_stream(
+        self, documents: Iterable[ProcessedDocument]
+    ) -> List[ConsolidationAnalysisResult]:
+        """Analyze documents as they are loaded, overlapping loading with LLM requests"""
+        return asyncio.run(self.aanalyze_document_stream(documents))
+
+    async def aanalyze_document_stream(
+        self, documents: Iterable[ProcessedDocument]
+    ) -> List[ConsolidationAnalysisResult]:
+        """Async counterpart of analyze_document_stream"""
+        return await self._analyze_documents_async(documents)
+
     def _analyze_documents(self, documents: List[ProcessedDocument]) -> List[ConsolidationAnalysisResult]:
-        """Analyze document files and their structure using threading"""
-        def process_document(doc: ProcessedDocument):
-            with ThreadPoolExecutor(max_workers=self.chunk_concurrency) as chunk_executor:
-                chunk_futures = [chunk_executor.submit(self._analyze_chunk, chunk.text, chunk.index) for chunk in doc.chunks]
-                chunk_results = []
-                for cf in tqdm(chunk_futures):
-                    chunk_result = cf.result()
-                    chunk_results.append(chunk_result)
-                return self._consolidate_results(chunk_results)
-
-        results = []
-        with ThreadPoolExecutor(max_workers=self.doc_concurrency) as executor:
-            futures = [executor.submit(process_document, doc) for doc in documents]
-            with tqdm(total=len(futures), desc="Analyzing documents", unit="docs") as pbar:
-                for future in as_completed(futures):
-                    result = future.result()
-                    if result:
-                        results.append(result)
-                    pbar.update(1)
-
-        return results
+        """Analyze document files and their structure with concurrent LLM requests"""
+        return asyncio.run(self._analyze_documents_async(documents))
+
+    async def _analyze_documents_async(
+        self, documents: Iterable[ProcessedDocument]
+    ) -> List[ConsolidationAnalysisResult]:
+        """Fan out chunk and consolidation requests with bounded concurrency"""
+        semaphore = asyncio.Semaphore(self.doc_concurrency * self.chunk_concurrency)
+        # Bounds documents pulled from the iterable ahead of their analysis
+        doc_slots = asyncio.Semaphore(self.doc_concurrency)
+        total_chunks = (
+            sum(len(doc.chunks) for doc in documents)
+            if isinstance(documents, list)
+            else None
+        )
+        # Throttle redraws, as thousands of small batches can complete in bursts
+        with tqdm(
+            total=total_chunks,
+            desc="Analyzing chunks",
+            unit="chunks",
+            mininterval=0.25,
+            miniters=max(1, (total_chunks or 0) // 200),
+        ) as pbar:
+            async def analyze_batch(batch: List[DocumentChunk], routing_key: str):
+                async with semaphore:
+                    batch_results = await self._analyze_chunk_batch(batch, routing_key)
+                pbar.update(len(batch))
+                return batch_results
+
+            async def process_document(doc: ProcessedDocument):
+                try:
+                    routing_key = self._document_routing_key(doc)
+                    # Analyze each distinct chunk content once and fan results out
+                    groups = self._group_identical_chunks(doc.chunks)
+                    unique_chunks = [group[0] for group in groups]
+                    pbar.update(len(doc.chunks) - len(unique_chunks))
+                    batches = [
+                        unique_chunks[i:i + self.chunk_batch_size]
+                        for i in range(0, len(unique_chunks), self.chunk_batch_size)
+                    ]
+                    batch_results = await asyncio.gather(
+                        *(analyze_batch(b, routing_key) for b in batches)
+                    )
+                    unique_results = [r for batch in batch_results for r in batch]
+                    if not unique_results:
+                        return None
+                    results_by_index = {}
+                    for group, result in zip(groups, unique_results, strict=True):
+                        for chunk in group:
+                            results_by_index[chunk.index] = (
+                                result
+                                if result.chunk_index == chunk.index
+                                else result.model_copy(update={"chunk_index": chunk.index})
+                            )
+                    chunk_results = [results_by_index[chunk.index] for chunk in doc.chunks]
+                    return await self._consolidate_results(
+                        chunk_results, semaphore, routing_key
+                    )
+                finally:
+                    doc_slots.release()
+
+            # Load documents in a worker thread so file parsing and chunking
+            # overlap with LLM requests for documents already loaded
+            doc_iter = iter(documents)
+            tasks = []
+            while True:
+                await doc_slots.acquire()
+                doc = await asyncio.to_thread(next, doc_iter, None)
+                if doc is None:
+                    doc_slots.release()
+                    break
+                tasks.append(asyncio.create_task(process_document(doc)))
+
+            results = await asyncio.gather(*tasks)
+
+        return [result for result in results if result]
@@ -1,30 +1,97 @@
+import asyncio
+import json
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import cache
+from itertools import groupby
 from typing import List
 
 from tqdm import tqdm
 
+from deepnotes.config.config import get_config
+from deepnotes.llm.llm_cache import CachedLLM
 from deepnotes.llm.llm_wrapper import get_llm_model
 from deepnotes.models.analyzer_models import (
     ConsolidationAnalysisResult,
     Entity,
+    EntityBatchResolutionResult,
+    KnowledgeGraph,
     Relationship,
 )
 from deepnotes.storage.graph_storage import get_graph_storage
 
 
+@cache
+def _schema_json(model: type) -> str:
+    """JSON schema of a response model, generated once per model class"""
+    return json.dumps(model.model_json_schema())
+
+
+def _group_key(entity: Entity) -> tuple[str, str]:
+    """Entities sharing this key are treated as duplicates"""
+    return entity.name.casefold(), entity.type
+
+
 class KnowledgeProcessor:
-    def __init__(self):
+    def __init__(self, config: dict = None):
+        self.config = config or {}
         self.graph_storage = get_graph_storage()
-        self.llm = get_llm_model()
-        self._base_graph = self.graph_storage.get_knowledge_graph()
-        self.last_update = datetime.utcnow()
+        # Conflicts recur across reruns over the same sources, so resolutions are
+        # served from the completion cache shared with ContentAnalyzer
+        self.llm = CachedLLM(
+            get_llm_model(),
+            self.config.get("llm_cache_path", get_config()["llm"].get("cache_path")),
+        )
+        # Concurrent LLM requests and conflicts per request when resolving conflicts
+        self.conflict_concurrency = self.config.get("conflict_resolution", 8)
+        self.conflict_batch_size = self.config.get("conflict_batch_size", 8)
+        self._pending_entity_conflicts: list[tuple[Entity, Entity]] = []
+        self._pending_relationship_conflicts: list[
+            tuple[Relationship, Relationship]
+        ] = []
+        self._refresh_base_graph()
+        self.last_update = datetime.now(timezone.utc)
 
     def get_knowledge_graph(self):
         return self._base_graph
 
+    def _refresh_base_graph(self):
+        """Reload the knowledge graph from storage and rebuild the id indexes"""
+        self._base_graph = self.graph_storage.get_knowledge_graph()
+        self._entity_index: dict[str, Entity] = {
+            e.id: e for e in self._base_graph.entities
+        }
+        self._rel_index: dict[str, Relationship] = {}
+        # Relationship ids by source and target entity id
+        self._rels_by_endpoint: defaultdict[str, set[str]] = defaultdict(set)
+        for rel in self._base_graph.relationships:
+            self._index_relationship(rel)
+        # Ids written since the last optimization; a reload may change anything
+        self._dirty_entity_ids: set[str] = set(self._entity_index)
+        self._dirty_rel_ids: set[str] = set(self._rel_index)
+
+    def _sync_base_graph(self):
+        """Rebuild the in-memory base graph from the id indexes"""
+        self._base_graph = KnowledgeGraph(
+            entities=list(self._entity_index.values()),
+            relationships=list(self._rel_index.values()),
+        )
+
+    def _index_relationship(self, rel: Relationship):
+        """Add or replace a relationship in the id and endpoint indexes"""
+        self._rel_index[rel.id] = rel
+        self._rels_by_endpoint[rel.source].add(rel.id)
+        self._rels_by_endpoint[rel.target].add(rel.id)
+
     def merge_analysis(self, new_results: List[ConsolidationAnalysisResult]):
         """Merge new analysis results with incremental update logic"""
+        return asyncio.run(self.amerge_analysis(new_results))
+
+    async def amerge_analysis(self, new_results: List[ConsolidationAnalysisResult]):
+        """
+        Async counterpart of merge_analysis. Every LLM conflict resolution of the
+        merge runs on the caller's event loop.
+        """
         # Track changes for optimization
         changes = {
             "entities_added": 0,
@@ -32,97 +99,203 @@ class KnowledgeProcessor:
             "relationships_added": 0,
             "relationships_updated": 0,
         }
+        # Re-submitted items identical to the stored ones, not counted as changes
+        skipped = 0
 
         for result in tqdm(new_results, desc="Merging knowledge"):
             if result.knowledge_graph:
-                changes["entities_added"], changes["entities_updated"] = (
-                    self._merge_entities(result.knowledge_graph.entities)
+                added, updated, unchanged = await self._merge_entities(
+                    result.knowledge_graph.entities
                 )
-                changes["relationships_added"], changes["relationships_updated"] = (
-                    self._merge_relationships(result.knowledge_graph.relationships)
+                changes["entities_added"] += added
+                changes["entities_updated"] += updated
+                skipped += unchanged
+                added, updated, unchanged = await self._merge_relationships(
+                    result.knowledge_graph.relationships
                 )
+                changes["relationships_added"] += added
+                changes["relationships_updated"] += updated
+                skipped += unchanged
+
+        # Indexes are kept current while merging, so rebuild the graph from them
+        # rather than reloading it from storage
+        self._sync_base_graph()
 
         # Optimize if significant changes
         if sum(changes.values()) > 100:  # Threshold for optimization
-            self._optimize_graph()
+            await self._optimize_graph()
 
-        self.last_update = datetime.utcnow()
+        self.last_update = datetime.now(timezone.utc)
+        return {**changes, "skipped": skipped}
 
-    def _merge_entities(self, new_entities: List[Entity]):
+    async def _merge_entities(self, new_entities: List[Entity]):
         """Entity merging with conflict resolution"""
-        existing_ids = {e.id for e in self._base_graph.entities}
         entities_added = 0
         entities_updated = 0
-        for entity in tqdm(new_entities, desc="Merging entities"):
-            if entity.id in existing_ids:
-                self._update_entity(entity)
+        entities_skipped = 0
+        # Entities not needing LLM resolution are written to storage in one batch
+        writes = []
+        for entity in new_entities:
+            existing = self._entity_index.get(entity.id)
+            if existing == entity:
+                # Unchanged re-submission, nothing to write
+                entities_skipped += 1
+            elif existing is not None:
+                merged = self._update_entity(entity)
+                if merged:
+                    writes.append(merged)
                 entities_updated += 1
             else:
-                self.graph_storage.merge_entity(entity)
+                writes.append(entity)
                 entities_added += 1
-        # Refresh base graph after merging
-        self._base_graph = self.graph_storage.get_knowledge_graph()
-        return entities_added, entities_updated
+        self._write_entities(writes)
+        await self._resolve_pending_entity_conflicts()
+        return entities_added, entities_updated, entities_skipped
+
+    def _write_entities(self, entities: List[Entity]):
+        """Merge entities into storage in one batch and index the stored versions"""
+        if not entities:
+            return
+        for merged in self.graph_storage.merge_entities_batch(entities):
+            self._entity_index[merged.id] = merged
+            self._dirty_entity_ids.add(merged.id)
+
+    def _write_relationships(self, relationships: List[Relationship]):
+        """Merge relationships into storage in one batch and index the stored versions"""
+        if not relationships:
+            return
+        for merged in self.graph_storage.merge_relationships_batch(relationships):
+            self._index_relationship(merged)
+            self._dirty_rel_ids.add(merged.id)
 
-    def _merge_relationships(self, new_relationships: List[Relationship]):
+    async def _merge_relationships(self, new_relationships: List[Relationship]):
         """Relationship merging with structural validation"""
-        existing_ids = {r.id for r in self._base_graph.relationships}
         relationships_added = 0
         relationships_updated = 0
-        for relationship in tqdm(new_relationships, desc="Updating relationships"):
-            if relationship.id in existing_ids:
-                self._update_relationship(relationship)
+        relationships_skipped = 0
+        # Relationships not needing LLM resolution are written to storage in one batch
+        writes = []
+        for relationship in new_relationships:
+            existing = self._rel_index.get(relationship.id)
+            if existing == relationship:
+                relationships_skipped += 1
+            elif existing is not None:
+                merged = self._update_relationship(relationship)
+                if merged:
+                    writes.append(merged)
                 relationships_updated += 1
             elif self._validate_relationship(relationship):
-                self.graph_storage.merge_relationship(relationship)
+                writes.append(relationship)
                 relationships_added += 1
-        # Refresh base graph after merging
-        self._base_graph = self.graph_storage.get_knowledge_graph()
-        return relationships_added, relationships_updated
+        self._write_relationships(writes)
+        await self._resolve_pending_relationship_conflicts()
+        return relationships_added, relationships_updated, relationships_skipped
 
-    def _update_entity(self, new_entity: Entity):
-        """LLM-assisted entity update with version tracking"""
-        existing = next(e for e in self._base_graph.entities if e.id == new_entity.id)
+    def _update_entity(self, new_entity: Entity) -> Entity | None:
+        """
+        LLM-assisted entity update with version tracking. Returns the entity to
+        write, or None when the update is deferred to LLM conflict resolution.
+        """
+        existing = self._entity_index[new_entity.id]
 
         # Simple merge for non-conflicting attributes
         if existing.name == new_entity.name and existing.type == new_entity.type:
-            existing.attributes.update(new_entity.attributes)
-            existing.metadata.update(new_entity.metadata)
+            # Reassign rather than update in place so the cached JSON is invalidated
+            existing.attributes = {
+                **(existing.attributes or {}),
+                **(new_entity.attributes or {}),
+            }
+            existing.metadata = {
+                **(existing.metadata or {}),
+                **(new_entity.metadata or {}),
+            }
+            return existing
+
+        # LLM-assisted conflict resolution, deferred so conflicts are resolved together
+        self._pending_entity_conflicts.append((existing, new_entity))
+        return None
+
+    async def _resolve_pending_entity_conflicts(self):
+        """Resolve buffered entity conflicts with batched, concurrent LLM requests"""
+        pairs, self._pending_entity_conflicts = self._pending_entity_conflicts, []
+        batches = [
+            pairs[i : i + self.conflict_batch_size]
+            for i in range(0, len(pairs), self.conflict_batch_size)
+        ]
+        if not batches:
             return
+        merged_batches = await self._gather_bounded(
+            self._resolve_entity_conflict_batch(batch) for batch in batches
+        )
+        self._write_entities([e for merged in merged_batches for e in merged if e])
+
+    async def _gather_bounded(self, coroutines):
+        """Await coroutines concurrently, at most conflict_concurrency at a time"""
+        semaphore = asyncio.Semaphore(self.conflict_concurrency)
+
+        async def run(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
 
-        # LLM-assisted conflict resolution
-        merged_entity = self._resolve_entity_conflict(existing, new_entity)
-        self.graph_storage.merge_entity(merged_entity)
+    async def _resolve_entity_conflict_batch(
+        self, pairs: List[tuple[Entity, Entity]]
+    ) -> List[Entity]:
+        """Resolve several entity conflicts in one LLM request"""
+        if len(pairs) == 1:
+            return [await self._resolve_entity_conflict(*pairs[0])]
 
-    def _resolve_entity_conflict(self, existing: Entity, new: Entity) -> Entity:
+        conflicts = "\n\n".join(
+            f"""Conflict {idx}:
+        Existing Entity: {existing.cached_json()}
+        New Entity: {new.cached_json()}
+        Connected Relationships:
+        {self._get_entity_connections(existing.id)}"""
+            for idx, (existing, new) in enumerate(pairs)
+        )
+        prompt = f"""Resolve each of the following entity conflicts in knowledge graph.
+        Return exactly one merged entity per conflict, in the same order as the conflicts.
+        {conflicts}
+        Return merged JSON using this schema: {_schema_json(EntityBatchResolutionResult)}"""
+
+        merged = (
+            await self.llm.agenerate(prompt, response_model=EntityBatchResolutionResult)
+        ).model_instance
+        if merged and len(merged.entities) == len(pairs):
+            return merged.entities
+        # Fall back to one request per conflict if the batch response is incomplete
+        return [await self._resolve_entity_conflict(*pair) for pair in pairs]
+
+    async def _resolve_entity_conflict(self, existing: Entity, new: Entity) -> Entity:
         """LLM-assisted entity conflict resolution with graph context"""
         prompt = f"""Resolve entity conflict in knowledge graph:
-        Existing Entity: {existing.model_dump_json()}
-        New Entity: {new.model_dump_json()}
+        Existing Entity: {existing.cached_json()}
+        New Entity: {new.cached_json()}
         Connected Relationships:
         {self._get_entity_connections(existing.id)}
-        Return merged JSON using this schema: {Entity.model_json_schema()}"""
+        Return merged JSON using this schema: {_schema_json(Entity)}"""
 
-        return self.llm.generate(prompt, response_model=Entity).model_instance
+        return (await self.llm.agenerate(prompt, response_model=Entity)).model_instance
 
     def _get_entity_connections(self, entity_id: str) -> str:
         """Get relationships for conflict resolution context"""
         return "\n".join(
-            f"- {rel.id} ({rel.type})"
-            for rel in self._base_graph.relationships
-            if rel.source == entity_id or rel.target == entity_id
+            f"- {rel_id} ({self._rel_index[rel_id].type})"
+            for rel_id in sorted(self._rels_by_endpoint.get(entity_id, ()))
         )
 
-    def _update_relationship(self, new_relationship: Relationship):
-        """Enhanced relationship update with proper conflict resolution"""
-        existing = next(
-            (r for r in self._base_graph.relationships if r.id == new_relationship.id),
-            None,
-        )
+    def _update_relationship(
+        self, new_relationship: Relationship
+    ) -> Relationship | None:
+        """
+        Enhanced relationship update with proper conflict resolution. Returns the
+        relationship to write, or None when deferred to LLM conflict resolution.
+        """
+        existing = self._rel_index.get(new_relationship.id)
 
         if not existing:
-            self.graph_storage.merge_relationship(new_relationship)
-            return
+            return new_relationship
 
         # Resolve conflict using LLM if structural changes
         if (
@@ -130,88 +303,167 @@ class KnowledgeProcessor:
             or existing.target != new_relationship.target
             or existing.type != new_relationship.type
         ):
-            merged = self._resolve_relationship_conflict(existing, new_relationship)
-            self.graph_storage.merge_relationship(merged)
-        else:
-            # Simple attribute merge
-            self.graph_storage.merge_relationship(new_relationship)
+            self._pending_relationship_conflicts.append((existing, new_relationship))
+            return None
+        # Simple attribute merge
+        return new_relationship
+
+    async def _resolve_pending_relationship_conflicts(self):
+        """Resolve buffered relationship conflicts with concurrent LLM requests"""
+        pairs, self._pending_relationship_conflicts = (
+            self._pending_relationship_conflicts,
+            [],
+        )
+        if not pairs:
+            return
+        merged = await self._gather_bounded(
+            self._resolve_relationship_conflict(*pair) for pair in pairs
+        )
+        self._write_relationships([r for r in merged if r])
 
-    def _resolve_relationship_conflict(
+    async def _resolve_relationship_conflict(
         self, existing: Relationship, new: Relationship
     ) -> Relationship:
         """LLM-assisted relationship conflict resolution"""
+        source = self._entity_index.get(existing.source)
+        target = self._entity_index.get(existing.target)
         prompt = f"""Resolve relationship conflict (DON'T include 'id' field):
-        Existing: {existing.model_dump(exclude={"id"})}
-        New: {new.model_dump(exclude={"id"})}
+        Existing: {existing.cached_json()}
+        New: {new.cached_json()}
         Connected Entities:
-        - Source: {self.graph_storage.get_entity(existing.source).name if self.graph_storage.get_entity(existing.source) else "Missing"}
-        - Target: {self.graph_storage.get_entity(existing.target).name if self.graph_storage.get_entity(existing.target) else "Missing"}
-        Return merged JSON using this schema: {Relationship.model_json_schema()}"""
+        - Source: {source.name if source else "Missing"}
+        - Target: {target.name if target else "Missing"}
+        Return merged JSON using this schema: {_schema_json(Relationship)}"""
 
-        merged = self.llm.generate(prompt, response_model=Relationship).model_instance
-        # Recompute ID after merge
-        merged.id = f"{merged.source}__{merged.type}__{merged.target}"
-        return merged
+        # ID is derived from source, type and target of the merged relationship
+        return (
+            await self.llm.agenerate(prompt, response_model=Relationship)
+        ).model_instance
 
-    def _resolve_conflicts(self):
+    async def _resolve_conflicts(self):
         """Resolve inter-entity conflicts and semantic duplicates"""
-        entity_groups = defaultdict(list)
-        for entity in self._base_graph.entities:
-            key = (entity.name.lower(), entity.type)
-            entity_groups[key].append(entity)
+        # Only groups containing an entity written since the last optimization
+        # can have gained a duplicate
+        dirty_keys = {
+            _group_key(e)
+            for e in map(self._entity_index.get, self._dirty_entity_ids)
+            if e is not None
+        }
+        candidates = sorted(
+            (e for e in self._base_graph.entities if _group_key(e) in dirty_keys),
+            key=_group_key,
+        )
+        duplicate_groups = [
+            group
+            for group in (list(g) for _, g in groupby(candidates, key=_group_key))
+            if len(group) > 1
+        ]
+        if not duplicate_groups:
+            return
+        with tqdm(
+            total=len(duplicate_groups), desc="Resolving conflicts", mininterval=1.0
+        ) as pbar:
 
-        for group in tqdm(
-            entity_groups.values(), desc="Resolving conflicts", total=len(entity_groups)
-        ):
-            if len(group) > 1:
-                merged_entity = self._merge_entity_group(group)
-                for entity in group:
-                    self.graph_storage.merge_entity(entity)
+            async def merge_group(group: List[Entity]):
+                merged_entity = await self._merge_entity_group(group)
+                pbar.update(1)
+                return merged_entity
+
+            merged_entities = await self._gather_bounded(
+                merge_group(group) for group in duplicate_groups
+            )
+
+        self._write_entities([e for e in merged_entities if e])
 
     def _prune_orphans(self):
         """Remove orphaned entities and invalid relationships"""
-        entity_ids = {e.id for e in self._base_graph.entities}
-
-        # Clean up relationships first
-        valid_relationships = []
-        for rel in tqdm(self._base_graph.relationships, desc="Pruning relationships"):
-            if rel.source in entity_ids and rel.target in entity_ids:
-                valid_relationships.append(rel)
-        self._base_graph.relationships = valid_relationships
+        # Only relationships and entities around dirty ids can have changed
+        rel_ids = set(self._dirty_rel_ids)
+        for entity_id in self._dirty_entity_ids:
+            rel_ids.update(self._rels_by_endpoint.get(entity_id, ()))
+        candidates = set(self._dirty_entity_ids)
+
+        # Drop dangling relationships
+        for rel_id in rel_ids:
+            rel = self._rel_index.get(rel_id)
+            if rel is None:
+                continue
+            candidates.update((rel.source, rel.target))
+            if (
+                rel.source not in self._entity_index
+                or rel.target not in self._entity_index
+            ):
+                del self._rel_index[rel_id]
+                self._rels_by_endpoint[rel.source].discard(rel_id)
+                self._rels_by_endpoint[rel.target].discard(rel_id)
 
         # Remove entities without connections
-        connected_entities = set()
-        for rel in tqdm(valid_relationships, desc="Checking connections"):
-            connected_entities.add(rel.source)
-            connected_entities.add(rel.target)
-
-        self._base_graph.entities = [
-            e
-            for e in self._base_graph.entities
-            if e.id in connected_entities or e.metadata.get("keep_always")
-        ]
+        for entity_id in candidates:
+            entity = self._entity_index.get(entity_id)
+            if (
+                entity is not None
+                and not self._rels_by_endpoint.get(entity_id)
+                and not entity.metadata.get("keep_always")
+            ):
+                del self._entity_index[entity_id]
+        self._sync_base_graph()
 
     def _validate_relationship(self, relationship: Relationship) -> bool:
         """Ensure relationship endpoints exist in knowledge base"""
-        entity_ids = {e.id for e in self._base_graph.entities}
-        return relationship.source in entity_ids and relationship.target in entity_ids
+        return (
+            relationship.source in self._entity_index
+            and relationship.target in self._entity_index
+        )
 
-    def _merge_entity_group(self, entities: List[Entity]) -> Entity | None:
-        """Merge multiple conflicting entities using LLM"""
-        prompt = f"""Merge these duplicate entities into one authoritative version:
-        {[e.model_dump_json() for e in entities]}
-        Return merged JSON using this schema: {Entity.model_json_schema()}"""
+    async def _merge_entity_group(self, entities: List[Entity]) -> Entity | None:
+        """Merge multiple conflicting entities, using LLM only on genuine conflicts"""
+        merged = self._union_entity_group(entities)
+        if merged is not None:
+            return merged
 
-        return self.llm.generate(
-            prompt,
-            response_model=Entity,
+        # Join the cached per-entity JSON into one array instead of the repr of a list
+        entities_json = "[" + ",".join(e.cached_json() for e in entities) + "]"
+        prompt = f"""Merge these duplicate entities into one authoritative version:
+        {entities_json}
+        Return merged JSON using this schema: {_schema_json(Entity)}"""
+
+        return (
+            await self.llm.agenerate(
+                prompt,
+                response_model=Entity,
+            )
         ).model_instance
 
-    def _optimize_graph(self):
+    @staticmethod
+    def _union_entity_group(entities: List[Entity]) -> Entity | None:
+        """
+        Deterministically merge entities whose descriptions, attributes and metadata
+        do not disagree; returns None if any value conflicts
+        """
+        descriptions = {e.description for e in entities if e.description}
+        if len(descriptions) > 1:
+            return None
+
+        merged_fields = {"description": next(iter(descriptions), None)}
+        for field in ("attributes", "metadata"):
+            merged = {}
+            for entity in entities:
+                for key, value in (getattr(entity, field) or {}).items():
+                    if key in merged and merged[key] != value:
+                        return None
+                    merged[key] = value
+            merged_fields[field] = merged
+        return entities[0].model_copy(update=merged_fields)
+
+    async def _optimize_graph(self):
         """Perform graph optimizations"""
-        self._resolve_conflicts()
+        # Indexes mirror the stored versions of everything written, so only the
+        # regions touched since the last optimization are revisited
+        await self._resolve_conflicts()
         self._prune_orphans()
         self._compact_storage()
+        self._dirty_entity_ids.clear()
+        self._dirty_rel_ids.clear()
 
     def _compact_storage(self):
         """Compact storage to reclaim space and optimize indices"""
@@ -1,34 +1,100 @@
+import json
+import os
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
 
 from sqlalchemy import (
     JSON,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
+    TypeDecorator,
     create_engine,
+    delete,
+    event,
+    func,
+    insert,
     select,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, relationship
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    Session,
+    mapped_column,
+    relationship,
+    sessionmaker,
+)
+
+
+def _normalize_path(path: str) -> str:
+    # Relative paths resolve against the working directory, so only absolute
+    # paths are cached
+    if os.path.isabs(path):
+        return _normalize_absolute_path(path)
+    return os.path.abspath(path)
+
+
+@lru_cache(maxsize=4096)
+def _normalize_absolute_path(path: str) -> str:
+    return os.path.normpath(path)
 
 
 class Base(DeclarativeBase):
     pass
 
 
+class CompressedJSON(TypeDecorator):
+    """
+    JSON value stored as a zlib-compressed blob on SQLite. Other databases keep a
+    native JSON column, since existing JSON columns there reject binary values
+    and there is no migration to convert them.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(LargeBinary())
+        return dialect.type_descriptor(JSON())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        # SQLite is dynamically typed, so rows written before compression still
+        # hold plain JSON text in the now-binary column
+        if isinstance(value, str):
+            return json.loads(value)
+        return json.loads(zlib.decompress(value))
+
+
 class DocumentModel(Base):
     __tablename__ = "documents"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    path: Mapped[str] = mapped_column(String(500))
-    hash: Mapped[str] = mapped_column(String(64))
+    # Not unique: databases from before path normalization may hold duplicate
+    # paths, which store_document and get_document_by_path resolve to the newest row
+    path: Mapped[str] = mapped_column(String(500), index=True)
+    hash: Mapped[str] = mapped_column(String(64), index=True)
     meta_info: Mapped[Dict] = mapped_column(JSON)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    # Timestamps come from the database; onupdate renders NOW() into the UPDATE
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
 
     chunks: Mapped[List["DocumentChunkModel"]] = relationship(back_populates="document")
@@ -39,12 +105,15 @@ class DocumentModel(Base):
 
 class DocumentChunkModel(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = (Index("ix_chunk_doc_idx", "document_id", "index"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id"))
+    document_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("documents.id"), index=True
+    )
     index: Mapped[int] = mapped_column(Integer)
     content: Mapped[str] = mapped_column(Text)
-    meta_info: Mapped[Dict] = mapped_column(JSON)
+    meta_info: Mapped[Dict] = mapped_column(CompressedJSON)
 
     document: Mapped[DocumentModel] = relationship(back_populates="chunks")
     analysis_results: Mapped[List["ChunkAnalysisModel"]] = relationship(
@@ -57,8 +126,10 @@ class DocumentAnalysisModel(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id"))
-    analysis_data: Mapped[Dict] = mapped_column(JSON)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    analysis_data: Mapped[Dict] = mapped_column(CompressedJSON)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
 
     document: Mapped[DocumentModel] = relationship(back_populates="analysis_results")
 
@@ -68,8 +139,10 @@ class ChunkAnalysisModel(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     chunk_id: Mapped[int] = mapped_column(Integer, ForeignKey("document_chunks.id"))
-    analysis_data: Mapped[Dict] = mapped_column(JSON)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    analysis_data: Mapped[Dict] = mapped_column(CompressedJSON)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
 
     chunk: Mapped[DocumentChunkModel] = relationship(back_populates="analysis_results")
 
@@ -77,64 +150,178 @@ class ChunkAnalysisModel(Base):
 class DocumentStore:
     def __init__(self, database_url: str):
         # Enable SQLite foreign key support
-        engine_args = {}
+        engine_args = {"pool_pre_ping": True}
         if database_url.startswith("sqlite"):
             engine_args["connect_args"] = {"check_same_thread": False}
+        else:
+            engine_args.update(pool_size=8, max_overflow=16)
 
         self.engine = create_engine(database_url, **engine_args)
+        if database_url.startswith("sqlite"):
+            event.listen(self.engine, "connect", self._set_sqlite_pragmas)
         Base.metadata.create_all(self.engine)
+        # create_all skips existing tables, so add indexes missing from older databases
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+        # Keep returned objects readable after their session closes
+        self.SessionLocal = sessionmaker(self.engine, expire_on_commit=False)
 
-    def store_document(self, path: str, content_hash: str, metadata: Dict) -> int:
-        with Session(self.engine) as session:
-            document = DocumentModel(
-                path=str(Path(path).absolute()), hash=content_hash, meta_info=metadata
-            )
-            session.add(document)
+    @staticmethod
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Use WAL with relaxed fsync so readers don't block the writer"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")  # 64MB
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Session]:
+        """Session committed on success and rolled back on error"""
+        session = self.SessionLocal()
+        try:
+            yield session
             session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @contextmanager
+    def _scope(self, session: Optional[Session]) -> Iterator[Session]:
+        """Join the caller's transaction if given, else run in a new one"""
+        if session is not None:
+            yield session
+        else:
+            with self.transaction() as session:
+                yield session
+
+    def store_document(
+        self,
+        path: str,
+        content_hash: str,
+        metadata: Dict,
+        session: Optional[Session] = None,
+    ) -> int:
+        """
+        Insert a document, or replace the stored one with the same path. Chunks and
+        analyses of a replaced document are deleted so a re-ingest starts clean.
+        """
+        with self._scope(session) as session:
+            path = _normalize_path(os.fspath(path))
+            document = session.scalars(self._select_by_path(path)).first()
+            if document is None:
+                document = DocumentModel(path=path)
+                session.add(document)
+            else:
+                self._delete_derived_rows(session, document.id)
+            document.hash = content_hash
+            document.meta_info = metadata
+            # Flush populates the id via RETURNING; commit is left to the outer scope
+            session.flush()
             return document.id
 
-    def store_chunks(self, document_id: int, chunks: List[Dict]) -> List[DocumentChunkModel]:
-        with Session(self.engine) as session:
-            document = session.get(DocumentModel, document_id)
-            chunk_objects = []
-            for idx, chunk in enumerate(chunks):
-                chunk_obj = DocumentChunkModel(
-                    document_id=document_id,
-                    index=idx,
-                    content=chunk["text"],
-                    meta_info=chunk.get("metadata", {}),
-                )
-                chunk_objects.append(chunk_obj)
-            session.add_all(chunk_objects)
-            session.commit()
+    @staticmethod
+    def _delete_derived_rows(session: Session, document_id: int):
+        """Delete the chunks and analyses stored for a document"""
+        chunk_ids = select(DocumentChunkModel.id).where(
+            DocumentChunkModel.document_id == document_id
+        )
+        session.execute(
+            delete(ChunkAnalysisModel).where(ChunkAnalysisModel.chunk_id.in_(chunk_ids))
+        )
+        session.execute(
+            delete(DocumentChunkModel).where(DocumentChunkModel.document_id == document_id)
+        )
+        session.execute(
+            delete(DocumentAnalysisModel).where(
+                DocumentAnalysisModel.document_id == document_id
+            )
+        )
+
+    def store_chunks(
+        self,
+        document_id: int,
+        chunks: List[Dict],
+        session: Optional[Session] = None,
+    ) -> List[DocumentChunkModel]:
+        if not chunks:
+            return []
+        rows = [
+            {
+                "document_id": document_id,
+                "index": idx,
+                "content": chunk["text"],
+                "meta_info": chunk.get("metadata", {}),
+            }
+            for idx, chunk in enumerate(chunks)
+        ]
+        with self._scope(session) as session:
+            # ORM bulk insert: batched multi-row INSERTs instead of a unit-of-work
+            # flush per object, still returning the inserted chunk objects
+            chunk_objects = session.scalars(
+                insert(DocumentChunkModel).returning(
+                    DocumentChunkModel, sort_by_parameter_order=True
+                ),
+                rows,
+            ).all()
             return chunk_objects
 
-    def store_analysis(self, document_id: int, analysis_data: Dict) -> DocumentAnalysisModel:
-        with Session(self.engine) as session:
+    def store_analysis(
+        self,
+        document_id: int,
+        analysis_data: Dict,
+        session: Optional[Session] = None,
+    ) -> DocumentAnalysisModel:
+        with self._scope(session) as session:
             analysis = DocumentAnalysisModel(
                 document_id=document_id, analysis_data=analysis_data
             )
             session.add(analysis)
-            session.commit()
+            session.flush()
             return analysis
 
-    def store_chunk_analysis(self, chunk_id: int, analysis_data: Dict) -> ChunkAnalysisModel:
-        with Session(self.engine) as session:
+    def store_chunk_analysis(
+        self,
+        chunk_id: int,
+        analysis_data: Dict,
+        session: Optional[Session] = None,
+    ) -> ChunkAnalysisModel:
+        with self._scope(session) as session:
             analysis = ChunkAnalysisModel(chunk_id=chunk_id, analysis_data=analysis_data)
             session.add(analysis)
-            session.commit()
+            session.flush()
             return analysis
 
     def get_document(self, document_id: int) -> Optional[DocumentModel]:
-        with Session(self.engine) as session:
+        with self.SessionLocal() as session:
             return session.get(DocumentModel, document_id)
 
     def get_document_by_path(self, path: str) -> Optional[DocumentModel]:
-        with Session(self.engine) as session:
-            stmt = select(DocumentModel).where(DocumentModel.path == str(Path(path).absolute()))
-            return session.execute(stmt).scalar_one_or_none()
+        with self.SessionLocal() as session:
+            stmt = self._select_by_path(_normalize_path(os.fspath(path)))
+            return session.scalars(stmt).first()
+
+    @staticmethod
+    def _select_by_path(path: str):
+        """Newest document stored under a normalized path"""
+        return (
+            select(DocumentModel)
+            .where(DocumentModel.path == path)
+            .order_by(DocumentModel.id.desc())
+            .limit(1)
+        )
 
     def get_chunks(self, document_id: int) -> List[DocumentChunkModel]:
-        with Session(self.engine) as session:
-            stmt = select(DocumentChunkModel).where(DocumentChunkModel.document_id == document_id)
+        with self.SessionLocal() as session:
+            stmt = (
+                select(DocumentChunkModel)
+                .where(DocumentChunkModel.document_id == document_id)
+                .order_by(DocumentChunkModel.index)
+            )
             return session.execute(stmt).scalars().all()
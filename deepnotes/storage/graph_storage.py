@@ -1,16 +1,58 @@
+import gzip
+import json
+import operator
 import os
+import pickle
+import sys
+import threading
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
 from pathlib import Path
-from typing import Optional
+from typing import Optional, get_args
 
 import networkx as nx
 from neo4j import GraphDatabase
+from pydantic import BaseModel
 
 from deepnotes.config.config import get_config
 from deepnotes.models.analyzer_models import Entity, KnowledgeGraph, Relationship
 
 
+def _explicit_fields(model: BaseModel) -> dict:
+    """Explicitly set field values, read directly instead of via model_dump"""
+    return {name: getattr(model, name) for name in model.model_fields_set}
+
+
+@cache
+def _map_fields(model: type[BaseModel]) -> tuple[str, ...]:
+    """Dict-valued fields, which Neo4j can't store as property values"""
+    return tuple(
+        name
+        for name, field in model.model_fields.items()
+        if dict in (field.annotation, *get_args(field.annotation))
+    )
+
+
+def _to_neo4j_properties(model: type[BaseModel], values: dict) -> dict:
+    """Property map for Neo4j, with dict fields encoded as JSON strings"""
+    map_fields = _map_fields(model)
+    return {
+        name: json.dumps(value) if name in map_fields and value is not None else value
+        for name, value in values.items()
+    }
+
+
+def _from_neo4j_properties(model: type[BaseModel], properties) -> dict:
+    """Field values from Neo4j properties, decoding JSON-encoded dict fields"""
+    values = dict(properties)
+    for name in _map_fields(model):
+        if isinstance(values.get(name), str):
+            values[name] = json.loads(values[name])
+    return values
+
+
 class GraphStorage(ABC):
     @abstractmethod
     def get_entity(self, entity_id: str) -> Optional[Entity]:
@@ -32,200 +74,501 @@ class GraphStorage(ABC):
     def find_duplicate_entities(self) -> list[list[Entity]]:
         pass
 
+    def merge_entities_batch(self, entities: list[Entity]) -> list[Entity]:
+        """
+        Merge many entities and return their stored versions; storages with
+        round-trip costs override this
+        """
+        return [self.merge_entity(entity) for entity in entities]
+
+    def merge_relationships_batch(self, rels: list[Relationship]) -> list[Relationship]:
+        """
+        Merge many relationships and return their stored versions; storages with
+        round-trip costs override this
+        """
+        return [self.merge_relationship(rel) for rel in rels]
+
     @abstractmethod
     def get_knowledge_graph(self) -> KnowledgeGraph:
         pass
 
 
 class NetworkXStorage(GraphStorage):
-    def __init__(self, graph_file: Path):
+    # GraphML for interop with other graph tools; jsonl and pickle are faster
+    # snapshot formats for Python-only round trips
+    SERIALIZERS = ("graphml", "jsonl", "pickle")
+
+    def __init__(self, graph_file: Path, serializer: str = "graphml"):
+        if serializer not in self.SERIALIZERS:
+            raise ValueError(f"Unsupported graph serializer: {serializer}")
         self.graph_file = graph_file
+        self.serializer = serializer
         self.graph = nx.MultiDiGraph()
 
         # Load existing graph if file exists
         if self.graph_file.exists():
-            self.graph = nx.readwrite.graphml.read_graphml(self.graph_file)
+            self.graph = self._load()
+        # Edge endpoints by relationship id, so lookups don't scan every edge
+        self._rel_index: dict[str, tuple[str, str, str]] = {
+            key: (u, v, key) for u, v, key in self.graph.edges(keys=True)
+        }
+
+    def _load(self) -> nx.MultiDiGraph:
+        if self.serializer == "pickle":
+            with self._open("rb") as f:
+                return pickle.load(f)
+        if self.serializer == "jsonl":
+            graph = nx.MultiDiGraph()
+            with self._open("rt") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if "node" in record:
+                        graph.add_node(record["node"], **record["attrs"])
+                    else:
+                        u, v, key = record["edge"]
+                        graph.add_edge(u, v, key=key, **record["attrs"])
+            return graph
+        return nx.readwrite.graphml.read_graphml(self.graph_file, force_multigraph=True)
 
     def save(self):
-        """Persist graph to file using GraphML format"""
-        nx.readwrite.graphml.write_graphml(self.graph, self.graph_file)
+        """Persist graph to file in the configured format"""
+        if self.serializer == "pickle":
+            with self._open("wb") as f:
+                pickle.dump(self.graph, f, protocol=5)
+        elif self.serializer == "jsonl":
+            # One record per node, then per edge, so files stream on load
+            with self._open("wt") as f:
+                for node_id, attrs in self.graph.nodes(data=True):
+                    f.write(json.dumps({"node": node_id, "attrs": attrs}) + "\n")
+                for u, v, key, attrs in self.graph.edges(keys=True, data=True):
+                    f.write(json.dumps({"edge": [u, v, key], "attrs": attrs}) + "\n")
+        else:
+            # libxml2-backed writer; skip indentation to cut serialization work.
+            # NetworkX compresses paths ending in .gz or .bz2 itself
+            nx.readwrite.graphml.write_graphml_lxml(
+                self.graph,
+                self.graph_file,
+                prettyprint=False,
+                infer_numeric_types=False,
+            )
+
+    def _open(self, mode: str):
+        """Open the snapshot file, gzip-compressed when its name ends in .gz"""
+        encoding = "utf-8" if "t" in mode else None
+        if self.graph_file.suffix == ".gz":
+            return gzip.open(self.graph_file, mode, encoding=encoding)
+        return open(self.graph_file, mode, encoding=encoding)
 
     def merge_entity(self, entity: Entity) -> Entity:
-        existing = self.get_entity(entity.id)
-        if existing:
-            # Simple attribute merge without resolution
-            merged = existing.model_copy(update=entity.model_dump(exclude_unset=True))
-            self.graph.nodes[entity.id].update(merged.model_dump())
-            return merged
+        data = self.graph.nodes.get(entity.id)
+        if data is not None:
+            # Simple attribute merge without resolution, updating the stored
+            # attributes in place from a single dump of the new entity
+            data.update(entity.model_dump(exclude_unset=True))
+            return Entity.model_construct(**data)
         self.graph.add_node(entity.id, **entity.model_dump())
         return entity
 
     def merge_relationship(self, rel: Relationship) -> Relationship:
-        existing = self.get_relationship(rel.id)
-        if existing:
+        edge = self._rel_index.get(rel.id)
+        if edge is not None:
             # Simple attribute merge without resolution
-            merged = existing.model_copy(update=rel.model_dump(exclude_unset=True))
-            self.graph.edges[rel.id].update(merged.model_dump())
-            return merged
+            data = self._edge_data(*edge)
+            data.update(rel.model_dump(exclude_unset=True))
+            return Relationship.model_construct(**data)
         self.graph.add_edge(rel.source, rel.target, key=rel.id, **rel.model_dump())
+        self._rel_index[rel.id] = (rel.source, rel.target, rel.id)
         return rel
 
     def get_entity(self, entity_id: str) -> Optional[Entity]:
-        if entity_id in self.graph.nodes:
-            return Entity(**self.graph.nodes[entity_id])
-        return None
+        data = self.graph.nodes.get(entity_id)
+        return Entity(**data) if data is not None else None
 
     def get_relationship(self, rel_id: str) -> Optional[Relationship]:
-        for u, v, key, data in self.graph.edges(keys=True, data=True):
-            if key == rel_id:
-                return Relationship(**data)
-        return None
+        edge = self._rel_index.get(rel_id)
+        if edge is None:
+            return None
+        return Relationship(**self._edge_data(*edge))
+
+    def _edge_data(self, source: str, target: str, key: str) -> dict:
+        """Data dict of an indexed edge, reached by key through the adjacency"""
+        return self.graph.adj[source][target][key]
 
     def find_duplicate_entities(self) -> list[list[Entity]]:
-        name_map = {}
-        for node_id in self.graph.nodes:
-            entity = self.get_entity(node_id)
-            if entity.name:
-                name_map.setdefault(entity.name, []).append(entity)
-        return [group for group in name_map.values() if len(group) > 1]
+        # Scan names alone and only build models for actual duplicates
+        name_map = defaultdict(list)
+        for node_id, name in self.graph.nodes(data="name"):
+            if name:
+                name_map[name.casefold()].append(node_id)
+        return [
+            [Entity(**self.graph.nodes[node_id]) for node_id in ids]
+            for ids in name_map.values()
+            if len(ids) > 1
+        ]
 
     def get_knowledge_graph(self) -> KnowledgeGraph:
-        entities = [Entity(**data) for _, data in self.graph.nodes(data=True)]
+        # Node and edge data were dumped from validated models, so skip validation
+        entities = [
+            Entity.model_construct(**data) for _, data in self.graph.nodes(data=True)
+        ]
         relationships = [
-            Relationship(**data) for _, _, data in self.graph.edges(data=True)
+            Relationship.model_construct(**data)
+            for _, _, data in self.graph.edges(data=True)
         ]
-        return KnowledgeGraph(entities=entities, relationships=relationships)
+        return KnowledgeGraph.model_construct(
+            entities=entities, relationships=relationships
+        )
 
 
 class Neo4jStorage(GraphStorage):
-    def __init__(self, uri: str, user: str, password: str):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    # Rows sent per UNWIND write transaction
+    write_batch_size = 1000
+
+    def __init__(
+        self,
+        uri: str,
+        user: str,
+        password: str,
+        database: Optional[str] = None,
+        max_connection_pool_size: int = 50,
+        writers: int = 1,
+    ):
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+        )
+        # Naming the database up front skips the home database lookup per session
+        self.database = database
+        # Sessions aren't thread safe, so each thread reuses its own
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        # Threads committing write batches concurrently, each with its own session
+        self._executor = (
+            ThreadPoolExecutor(max_workers=writers) if writers > 1 else None
+        )
+        self._entity_query = self._build_entity_merge()
+        self._entity_extract = operator.itemgetter(
+            *(name for name in Entity.model_fields if name not in _map_fields(Entity))
+        )
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        """Index entity and relationship ids so MERGE and lookups seek, not scan"""
+        session = self._session()
+        for statement in (
+            "CREATE CONSTRAINT entity_id IF NOT EXISTS "
+            "FOR (e:Entity) REQUIRE e.id IS UNIQUE",
+            "CREATE INDEX rel_id IF NOT EXISTS FOR ()-[r:RELATIONSHIP]-() ON (r.id)",
+        ):
+            # Schema changes can't share a transaction with each other
+            session.execute_write(lambda tx, statement=statement: tx.run(statement))
+
+    def _session(self):
+        """Long-lived session of the calling thread, created on first use"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self.driver.session(database=self.database)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        """Close the writer threads, every thread's session and the driver"""
+        if self._executor is not None:
+            self._executor.shutdown()
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+        self._local = threading.local()
+        self.driver.close()
 
     def merge_entity(self, entity: Entity) -> Entity:
-        with self.driver.session() as session:
-            session.execute_write(
-                lambda tx: tx.run(
-                    "MERGE (e:Entity {id: $id}) SET e += $props RETURN e",
-                    id=entity.id,
-                    props=entity.model_dump(exclude_unset=True),
-                )
-            )
-        return entity
+        return self.merge_entities_batch([entity])[0]
+
+    @staticmethod
+    def _build_entity_merge() -> str:
+        """
+        Generate the entity MERGE query from the Entity fields, so rows are plain
+        value lists read straight from the model and the query text never changes.
+        Every field is set positionally, keeping the stored value for None. Scalar
+        fields come first; dict fields follow as JSON strings, given only when
+        explicitly set.
+        """
+        scalar_fields = [
+            name for name in Entity.model_fields if name not in _map_fields(Entity)
+        ]
+        assignments = ", ".join(
+            f"e.{name} = coalesce(row[{idx}], e.{name})"
+            for idx, name in enumerate([*scalar_fields, *_map_fields(Entity)])
+            if name != "id"
+        )
+        return (
+            "UNWIND $rows AS row "
+            f"MERGE (e:Entity {{id: row[{scalar_fields.index('id')}]}}) "
+            f"SET {assignments} "
+            "RETURN properties(e) AS props"
+        )
+
+    def merge_entities_batch(self, entities: list[Entity]) -> list[Entity]:
+        """
+        Merge entities with UNWIND queries instead of one query per entity,
+        returning the stored versions
+        """
+        rows = []
+        for entity in entities:
+            values = entity.__dict__
+            maps = [
+                json.dumps(values[name]) if name in entity.model_fields_set else None
+                for name in _map_fields(Entity)
+            ]
+            rows.append([*self._entity_extract(values), *maps])
+        return [
+            Entity(**_from_neo4j_properties(Entity, props))
+            for props in self._write_rows(self._entity_query, rows)
+        ]
+
+    def _write_rows(self, query: str, rows: list) -> list:
+        """
+        Run an UNWIND write query over rows, one transaction per batch, and return
+        the props column of its results in row order
+        """
+        if not rows:
+            return []
+        batches = [
+            rows[i : i + self.write_batch_size]
+            for i in range(0, len(rows), self.write_batch_size)
+        ]
+        if self._executor is None or len(batches) == 1:
+            return [
+                props for batch in batches for props in self._write_batch(query, batch)
+            ]
+        # Wait for every batch so later writes (relationships) see these rows
+        futures = [
+            self._executor.submit(self._write_batch, query, batch) for batch in batches
+        ]
+        return [props for future in futures for props in future.result()]
+
+    def _write_batch(self, query: str, batch: list) -> list:
+        # Results are consumed inside the transaction function, before it commits
+        return self._session().execute_write(
+            lambda tx: [record["props"] for record in tx.run(query, rows=batch)]
+        )
 
     def get_entity(self, entity_id: str) -> Optional[Entity]:
-        with self.driver.session() as session:
-            result = session.execute_read(
-                lambda tx: tx.run(
-                    "MATCH (e:Entity {id: $id}) RETURN e", id=entity_id
-                ).single()
-            )
-            return Entity(**result["e"]) if result else None
+        session = self._session()
+        result = session.execute_read(
+            lambda tx: tx.run(
+                "MATCH (e:Entity {id: $id}) RETURN e", id=entity_id
+            ).single()
+        )
+        return Entity(**_from_neo4j_properties(Entity, result["e"])) if result else None
 
     def get_relationship(self, rel_id: str) -> Optional[Relationship]:
-        with self.driver.session() as session:
-            result = session.execute_read(
-                lambda tx: tx.run(
-                    "MATCH ()-[r {id: $id}]->() RETURN r", id=rel_id
-                ).single()
-            )
-            return Relationship(**result["r"]) if result else None
+        session = self._session()
+        result = session.execute_read(
+            lambda tx: tx.run(
+                "MATCH ()-[r:RELATIONSHIP {id: $id}]->() RETURN r", id=rel_id
+            ).single()
+        )
+        return (
+            Relationship(**_from_neo4j_properties(Relationship, result["r"]))
+            if result
+            else None
+        )
 
     def find_duplicate_entities(self) -> list[list[Entity]]:
-        with self.driver.session() as session:
-            result = session.execute_read(
-                lambda tx: tx.run(
-                    "MATCH (e:Entity)"
-                    "WITH e.name AS name, collect(e) AS group "
+        return self._session().execute_read(
+            lambda tx: [
+                [
+                    Entity(**_from_neo4j_properties(Entity, props))
+                    for props in record["group"]
+                ]
+                for record in tx.run(
+                    "MATCH (e:Entity) "
+                    "WITH toLower(e.name) AS name, collect(properties(e)) AS group "
                     "WHERE size(group) > 1 "
                     "RETURN group"
-                ).data()
-            )
-            return [[Entity(**node) for node in group["group"]] for group in result]
+                )
+            ]
+        )
 
     def get_knowledge_graph(self) -> KnowledgeGraph:
-        with self.driver.session() as session:
-            entities = session.execute_read(
-                lambda tx: [
-                    Entity(**record["e"])
-                    for record in tx.run("MATCH (e:Entity) RETURN e").data()
-                ]
-            )
-            relationships = session.execute_read(
-                lambda tx: [
-                    Relationship(**record["r"])
-                    for record in tx.run("MATCH ()-[r]->() RETURN r").data()
-                ]
-            )
+        def read_graph(tx):
+            # Build models while streaming records rather than buffering them
+            # all with .data() first
+            entities = [
+                Entity(**_from_neo4j_properties(Entity, record["e"]))
+                for record in tx.run("MATCH (e:Entity) RETURN properties(e) AS e")
+            ]
+            relationships = [
+                Relationship(**_from_neo4j_properties(Relationship, record["r"]))
+                for record in tx.run(
+                    "MATCH ()-[r:RELATIONSHIP]->() RETURN properties(r) AS r"
+                )
+            ]
             return KnowledgeGraph(entities=entities, relationships=relationships)
 
+        # One read transaction gives entities and relationships from one snapshot
+        return self._session().execute_read(read_graph)
+
     def merge_relationship(self, rel: Relationship) -> Relationship:
-        with self.driver.session() as session:
-            session.execute_write(
-                lambda tx: tx.run(
-                    "MATCH (a:Entity {id: $source}), (b:Entity {id: $target}) "
-                    "MERGE (a)-[r:RELATIONSHIP {id: $id}]->(b) "
-                    "SET r += $props RETURN r",
-                    id=rel.id,
-                    source=rel.source,
-                    target=rel.target,
-                    props=rel.model_dump(exclude_unset=True),
-                )
-            )
-        return rel
+        return self.merge_relationships_batch([rel])[0]
+
+    def merge_relationships_batch(self, rels: list[Relationship]) -> list[Relationship]:
+        """
+        Merge relationships with UNWIND queries instead of one per relationship,
+        returning the stored versions
+        """
+        rows = [
+            {
+                "id": rel.id,
+                "source": rel.source,
+                "target": rel.target,
+                "props": _to_neo4j_properties(
+                    Relationship, rel.model_dump(exclude_unset=True)
+                ),
+            }
+            for rel in rels
+        ]
+        stored = self._write_rows(
+            "UNWIND $rows AS row "
+            "MATCH (a:Entity {id: row.source}), (b:Entity {id: row.target}) "
+            "MERGE (a)-[r:RELATIONSHIP {id: row.id}]->(b) "
+            "SET r += row.props "
+            "RETURN properties(r) AS props",
+            rows,
+        )
+        return [
+            Relationship(**_from_neo4j_properties(Relationship, props))
+            for props in stored
+        ]
+
+
+class _ColumnTable:
+    """Models of one type stored as one list per field, keyed by model id"""
+
+    def __init__(self, model: type[BaseModel]):
+        self.model = model
+        self.columns: dict[str, list] = {name: [] for name in model.model_fields}
+        self._id_to_idx: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._id_to_idx)
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self._id_to_idx
+
+    def get(self, model_id: str):
+        idx = self._id_to_idx.get(model_id)
+        return None if idx is None else self._row(idx)
+
+    def value(self, model_id: str, name: str):
+        """Single field of a stored row, without building the model"""
+        return self.columns[name][self._id_to_idx[model_id]]
+
+    def put(self, model_id: str, values: dict):
+        """Insert a row, or overwrite the given fields of an existing one"""
+        idx = self._id_to_idx.get(model_id)
+        if idx is None:
+            self._id_to_idx[model_id] = len(self._id_to_idx)
+            for name, column in self.columns.items():
+                column.append(values.get(name))
+        else:
+            for name, value in values.items():
+                self.columns[name][idx] = value
+
+    def values(self) -> list:
+        return [self._row(idx) for idx in range(len(self._id_to_idx))]
+
+    def clear(self):
+        self._id_to_idx.clear()
+        for column in self.columns.values():
+            column.clear()
+
+    def _row(self, idx: int):
+        # Stored values came from validated models, so skip validation
+        return self.model.model_construct(
+            **{name: column[idx] for name, column in self.columns.items()}
+        )
 
 
 class MemoryStorage(GraphStorage):
-    """In-memory graph storage using dictionaries"""
+    """In-memory graph storage keeping entity and relationship fields column-wise"""
 
     def __init__(self):
-        self.entities: dict[str, Entity] = {}
-        self.relationships: dict[str, Relationship] = {}
+        self.entities = _ColumnTable(Entity)
+        self.relationships = _ColumnTable(Relationship)
+        # Entity ids by interned casefolded name, kept current on every merge so
+        # duplicate detection needs no scan
+        self._name_buckets: defaultdict[str, list[str]] = defaultdict(list)
 
     def get_entity(self, entity_id: str) -> Optional[Entity]:
         return self.entities.get(entity_id)
 
     def merge_entity(self, entity: Entity) -> Entity:
         if entity.id in self.entities:
-            existing = self.entities[entity.id]
-            merged = existing.model_copy(update=entity.model_dump(exclude_unset=True))
-            self.entities[entity.id] = merged
+            old_name = self.entities.value(entity.id, "name")
+            self.entities.put(entity.id, _explicit_fields(entity))
+            merged = self.entities.get(entity.id)
+            if merged.name != old_name:
+                self._unbucket(entity.id, old_name)
+                self._bucket(entity.id, merged.name)
             return merged
-        self.entities[entity.id] = entity
+        self.entities.put(entity.id, dict(entity))
+        self._bucket(entity.id, entity.name)
         return entity
 
+    def _bucket(self, entity_id: str, name: str):
+        if name:
+            self._name_buckets[sys.intern(name.casefold())].append(entity_id)
+
+    def _unbucket(self, entity_id: str, name: str):
+        if name:
+            key = name.casefold()
+            self._name_buckets[key].remove(entity_id)
+            if not self._name_buckets[key]:
+                del self._name_buckets[key]
+
     def get_relationship(self, rel_id: str) -> Optional[Relationship]:
         return self.relationships.get(rel_id)
 
     def merge_relationship(self, rel: Relationship) -> Relationship:
         if rel.id in self.relationships:
-            existing = self.relationships[rel.id]
-            merged = existing.model_copy(update=rel.model_dump(exclude_unset=True))
-            self.relationships[rel.id] = merged
-            return merged
-        self.relationships[rel.id] = rel
+            self.relationships.put(rel.id, _explicit_fields(rel))
+            return self.relationships.get(rel.id)
+        self.relationships.put(rel.id, dict(rel))
         return rel
 
     def find_duplicate_entities(self) -> list[list[Entity]]:
-        name_map = defaultdict(list)
-        for entity in self.entities.values():
-            if entity.name:
-                name_map[entity.name.lower()].append(entity)
-        return [group for group in name_map.values() if len(group) > 1]
+        return [
+            [self.entities.get(entity_id) for entity_id in ids]
+            for ids in self._name_buckets.values()
+            if len(ids) > 1
+        ]
 
     def get_knowledge_graph(self) -> KnowledgeGraph:
-        return KnowledgeGraph(
-            entities=list(self.entities.values()),
-            relationships=list(self.relationships.values()),
+        return KnowledgeGraph.model_construct(
+            entities=self.entities.values(),
+            relationships=self.relationships.values(),
         )
 
     def clear(self):
         """Clear all stored data (for testing)"""
         self.entities.clear()
         self.relationships.clear()
+        self._name_buckets.clear()
 
 
+@cache
 def get_graph_storage() -> GraphStorage:
-    """Factory method to create graph storage based on configuration"""
+    """
+    Factory method to create graph storage based on configuration. The storage is
+    created once and shared, so drivers and loaded graphs are not rebuilt per call.
+    """
     config = get_config()
     storage: GraphStorage
     storage_type = config["graph"]["storage_type"]
@@ -233,13 +576,19 @@ def get_graph_storage() -> GraphStorage:
         storage = MemoryStorage()
     elif storage_type == "networkx":
         storage = NetworkXStorage(
-            graph_file=Path(config["graph"]["networkx"]["graph_file"])
+            graph_file=Path(config["graph"]["networkx"]["graph_file"]),
+            serializer=config["graph"]["networkx"].get("serializer", "graphml"),
         )
     elif storage_type == "neo4j":
         storage = Neo4jStorage(
             uri=config["graph"]["neo4j"]["uri"],
             user=os.path.expandvars(config["graph"]["neo4j"]["user"]),
             password=os.path.expandvars(config["graph"]["neo4j"]["password"]),
+            database=config["graph"]["neo4j"].get("database"),
+            max_connection_pool_size=config["graph"]["neo4j"].get(
+                "max_connection_pool_size", 50
+            ),
+            writers=config["graph"]["neo4j"].get("writers", 1),
         )
     else:
         raise ValueError(f"Unsupported graph storage type: {storage_type}")
@@ -0,0 +1,50 @@
+from deepnotes.models.analyzer_models import Entity, Relationship
+
+
+def test_entity_cached_json_invalidated_on_assignment():
+    entity = Entity(id="a", name="A", type="concept")
+    first = entity.cached_json()
+
+    assert entity.cached_json() is first
+
+    entity.attributes = {"k": "v"}
+
+    assert entity.cached_json() == entity.model_dump_json()
+    assert '"k":"v"' in entity.cached_json()
+
+
+def test_cached_json_not_carried_over_by_model_copy():
+    rel = Relationship(source="a", target="b", type="uses")
+    rel.cached_json()
+
+    copied = rel.model_copy(update={"attributes": {"weight": 1}})
+
+    assert copied.cached_json() == copied.model_dump_json()
+    assert copied.id == rel.id
+
+
+def test_cached_json_does_not_affect_equality():
+    entity = Entity(id="a", name="A", type="concept")
+    other = Entity(id="a", name="A", type="concept")
+    entity.cached_json()
+
+    assert entity == other
+    assert entity != Entity(id="a", name="B", type="concept")
+    rel = Relationship(source="a", target="b", type="uses")
+    rel.cached_json()
+    assert rel == Relationship(source="a", target="b", type="uses")
+    assert len({rel, Relationship(source="a", target="b", type="uses")}) == 1
+
+
+def test_relationship_id_follows_model_copy_update():
+    rel = Relationship(source="a", target="b", type="uses")
+    assert rel.id == "a__uses__b"
+
+    copied = rel.model_copy(update={"source": "z"})
+
+    assert copied.id == "z__uses__b"
+    assert rel.id == "a__uses__b"
+    assert "id" not in dict(copied)
+    assert Relationship.model_construct(source="a", target="c", type="uses").id == (
+        "a__uses__c"
+    )
@@ -0,0 +1,36 @@
+import pytest
+
+from deepnotes.loaders.codebase_loader import CodebaseLoader
+from deepnotes.models.loader_models import CodebaseLoadedData, CodeFile
+from deepnotes.models.source_models import SourceConfig, SourceType
+
+
+@pytest.fixture
+def codebase_dir(tmp_path):
+    (tmp_path / "app.py").write_text(
+        "import os\n\nclass App:\n    pass\n\ndef main():\n    pass\n"
+    )
+    (tmp_path / "README.md").write_text("# App\n")
+    return tmp_path
+
+
+def test_codebase_loader_process(codebase_dir):
+    loader = CodebaseLoader(
+        SourceConfig(
+            type=SourceType.CODEBASE,
+            name="test_codebase",
+            connection={"path": str(codebase_dir)},
+        )
+    )
+    result = loader.process()
+
+    assert isinstance(result, CodebaseLoadedData)
+    assert result.data_type == "codebase"
+    assert len(result.files) == 2
+    assert all(isinstance(f, CodeFile) for f in result.files)
+
+    py_file = next(f for f in result.files if f.extension == ".py")
+    assert py_file.analysis["classes"] == ["App"]
+    assert py_file.analysis["functions"] == ["main"]
+    assert result.dependencies == ["os"]
+    assert result.global_metadata["total_files"] == 2
@@ -0,0 +1,280 @@
+import asyncio
+import re
+import threading
+
+import pytest
+
+from deepnotes.llm.llm_wrapper import LLMConfig, LLMResponse, LLMWrapper
+from deepnotes.models.analyzer_models import (
+    ChunkAnalysisResult,
+    ChunkBatchAnalysisResult,
+    ConsolidationAnalysisResult,
+    Entity,
+    KnowledgeGraph,
+    Relationship,
+)
+from deepnotes.models.loader_models import (
+    DocumentChunk,
+    DocumentLoadedData,
+    FileMetadata,
+    ProcessedDocument,
+)
+from deepnotes.models.source_models import SourceType
+from deepnotes.processors import content_analyzer
+
+
+class FakeLLM:
+    """Stub LLM returning canned analysis results and recording prompts"""
+
+    def __init__(self):
+        self.config = LLMConfig(
+            provider="fake", model="fake", base_url=None, api_key=None, api_version=None
+        )
+        self.prompts = []
+        self.lock = threading.Lock()
+        self.skip_indices = set()
+        self.routing_keys = []
+
+    def generate(self, prompt, parse_json=True, response_model=None, routing_key=None):
+        with self.lock:
+            self.prompts.append(prompt)
+        if response_model is ChunkAnalysisResult:
+            instance = ChunkAnalysisResult(summary="chunk summary")
+        elif response_model is ChunkBatchAnalysisResult:
+            instance = ChunkBatchAnalysisResult(
+                results=[
+                    ChunkAnalysisResult(chunk_index=int(idx), summary=f"batch {idx}")
+                    for idx in re.findall(r"Chunk (\d+):\n", prompt)
+                    if int(idx) not in self.skip_indices
+                ]
+            )
+        else:
+            instance = ConsolidationAnalysisResult(summary="document summary")
+        return LLMResponse(
+            content=instance.model_dump_json(),
+            provider="fake",
+            model="fake",
+            input_tokens=0,
+            output_tokens=0,
+            model_instance=instance,
+        )
+
+    async def agenerate(
+        self, prompt, parse_json=True, response_model=None, routing_key=None
+    ):
+        with self.lock:
+            self.routing_keys.append(routing_key)
+        return self.generate(prompt, parse_json, response_model)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    llm = FakeLLM()
+    monkeypatch.setattr(content_analyzer, "get_llm_model", lambda *args: llm)
+    return llm
+
+
+@pytest.fixture
+def analyzer(fake_llm, tmp_path):
+    return content_analyzer.ContentAnalyzer(
+        {
+            "database_uri": f"sqlite:///{tmp_path / 'deepnotes.db'}",
+            "llm_cache_path": None,
+        }
+    )
+
+
+def make_document(path, texts):
+    return ProcessedDocument(
+        metadata=FileMetadata(file_path=path, file_size=0, file_type=".txt"),
+        chunks=[DocumentChunk(text=text, index=idx) for idx, text in enumerate(texts)],
+    )
+
+
+def test_process_loaded_documents(analyzer, fake_llm):
+    data = DocumentLoadedData(
+        source_type=SourceType.DOCUMENT,
+        documents=[
+            make_document("a.txt", ["alpha", "beta"]),
+            make_document("b.txt", ["gamma"]),
+        ],
+    )
+
+    results = analyzer.process_loaded_data(data)
+
+    assert len(results) == 2
+    assert all(r.summary == "document summary" for r in results)
+    # One batched chunk call plus one consolidation call per document
+    assert len(fake_llm.prompts) == 4
+
+
+def test_analyze_chunk_sets_missing_index(analyzer):
+    result = asyncio.run(analyzer._analyze_chunk("some text", 3))
+
+    assert result.chunk_index == 3
+    assert result.summary == "chunk summary"
+
+
+def test_analyze_chunk_batch_falls_back_for_missing_chunks(analyzer, fake_llm):
+    fake_llm.skip_indices = {1}
+    chunks = [DocumentChunk(text=text, index=idx) for idx, text in enumerate("abc")]
+
+    results = asyncio.run(analyzer._analyze_chunk_batch(chunks))
+
+    assert [r.chunk_index for r in results] == [0, 1, 2]
+    assert [r.summary for r in results] == ["batch 0", "chunk summary", "batch 2"]
+    # One batched call plus one single-chunk call for the skipped chunk
+    assert len(fake_llm.prompts) == 2
+
+
+def test_analyze_documents_keeps_chunk_order_across_batches(analyzer, fake_llm):
+    analyzer.chunk_batch_size = 3
+    texts = [f"text {i}" for i in range(10)]
+
+    results = analyzer._analyze_documents([make_document("a.txt", texts)])
+
+    assert len(results) == 1
+    consolidation_prompt = fake_llm.prompts[-1]
+    positions = [consolidation_prompt.index(f'"batch {i}"') for i in range(9)]
+    assert positions == sorted(positions)
+    # Last batch holds a single chunk and uses the per-chunk prompt
+    assert '{"i":9,"s":"chunk summary"}' in consolidation_prompt
+
+
+def test_analyze_document_stream(analyzer, fake_llm):
+    loaded = []
+
+    def documents():
+        for path in ["a.txt", "b.txt", "c.txt"]:
+            loaded.append(path)
+            yield make_document(path, [f"{path} text"])
+
+    results = analyzer.analyze_document_stream(documents())
+
+    assert loaded == ["a.txt", "b.txt", "c.txt"]
+    assert len(results) == 3
+    assert all(r.summary == "document summary" for r in results)
+
+
+def test_consolidation_prompt_dedupes_topics_and_entities():
+    prompt = content_analyzer.ContentAnalyzer._create_consolidation_prompt(
+        [
+            ChunkAnalysisResult(
+                chunk_index=0, summary="one", core_topics=["a", "b"], key_entities=["x"]
+            ),
+            ChunkAnalysisResult(
+                chunk_index=1, summary="two", core_topics=["b", "c"], key_entities=["x"]
+            ),
+        ]
+    )
+
+    assert 'Core topics across chunks: ["a", "b", "c"]' in prompt
+    assert 'Key entities across chunks: ["x"]' in prompt
+    assert '[{"i":0,"s":"one"},{"i":1,"s":"two"}]' in prompt
+
+
+def test_consolidate_results_reduces_hierarchically(analyzer, fake_llm):
+    analyzer.consolidation_fan_in = 2
+    chunk_results = [
+        ChunkAnalysisResult(chunk_index=idx, summary=f"summary {idx}")
+        for idx in range(5)
+    ]
+
+    result = asyncio.run(analyzer._consolidate_results(chunk_results))
+
+    assert result.summary == "document summary"
+    assert all(prompt.count('{"i":') <= 2 for prompt in fake_llm.prompts)
+    # Every chunk summary reaches a leaf consolidation prompt
+    assert all(f'"s":"summary {idx}"' in "".join(fake_llm.prompts) for idx in range(5))
+
+
+def test_merge_knowledge_graphs_keeps_first_by_id():
+    merged = content_analyzer.ContentAnalyzer._merge_knowledge_graphs(
+        [
+            KnowledgeGraph(
+                entities=[Entity(id="a", name="A", type="concept")],
+                relationships=[Relationship(source="a", target="b", type="uses")],
+            ),
+            KnowledgeGraph(
+                entities=[
+                    Entity(id="a", name="Other A", type="concept"),
+                    Entity(id="b", name="B", type="concept"),
+                ],
+                relationships=[Relationship(source="a", target="b", type="uses")],
+            ),
+        ]
+    )
+
+    assert [(e.id, e.name) for e in merged.entities] == [("a", "A"), ("b", "B")]
+    assert [r.id for r in merged.relationships] == ["a__uses__b"]
+
+
+def test_analyze_documents_dedupes_identical_chunks(analyzer, fake_llm):
+    texts = ["header", "body one", "header", "body two", "header"]
+
+    results = analyzer._analyze_documents([make_document("a.txt", texts)])
+
+    assert len(results) == 1
+    chunk_prompt, consolidation_prompt = fake_llm.prompts
+    assert re.findall(r"Chunk (\d+):\n", chunk_prompt) == ["0", "1", "3"]
+    assert [f'"i":{idx},' in consolidation_prompt for idx in range(5)] == [True] * 5
+
+
+def test_chunk_model_used_for_chunk_analysis_only(monkeypatch, tmp_path):
+    default_llm, chunk_llm = FakeLLM(), FakeLLM()
+    monkeypatch.setattr(
+        content_analyzer,
+        "get_llm_model",
+        lambda provider=None, model=None: (
+            chunk_llm if model == "small" else default_llm
+        ),
+    )
+    analyzer = content_analyzer.ContentAnalyzer(
+        {
+            "database_uri": f"sqlite:///{tmp_path / 'deepnotes.db'}",
+            "llm_cache_path": None,
+            "chunk_model": "small",
+        }
+    )
+
+    analyzer._analyze_documents([make_document("a.txt", ["alpha", "beta"])])
+
+    assert len(chunk_llm.prompts) == 1
+    assert "Document chunks:" in chunk_llm.prompts[0]
+    assert len(default_llm.prompts) == 1
+    assert "Document chunk summaries" in default_llm.prompts[0]
+
+
+@pytest.mark.parametrize("fan_in", [0, 1])
+def test_consolidation_fan_in_must_reduce(fake_llm, tmp_path, fan_in):
+    with pytest.raises(ValueError, match="consolidation_fan_in"):
+        content_analyzer.ContentAnalyzer(
+            {
+                "database_uri": f"sqlite:///{tmp_path / 'deepnotes.db'}",
+                "llm_cache_path": None,
+                "consolidation_fan_in": fan_in,
+            }
+        )
+
+
+def test_requests_pinned_per_document(analyzer, fake_llm):
+    paths = [f"doc{idx}.txt" for idx in range(8)]
+
+    analyzer._analyze_documents(
+        [make_document(path, [f"{path} alpha", f"{path} beta"]) for path in paths]
+    )
+
+    # Every request is routed by the document it belongs to
+    keys = set(fake_llm.routing_keys)
+    assert sorted(key.split(":", 1)[1] for key in keys) == paths
+    wrapper = LLMWrapper(
+        LLMConfig(
+            provider="vllm",
+            model="fake",
+            base_url="http://primary/v1",
+            api_key="test",
+            api_version=None,
+            replica_urls=[f"http://replica-{idx}/v1" for idx in range(4)],
+        )
+    )
+    assert len({str(wrapper._get_client(key).base_url) for key in keys}) > 1
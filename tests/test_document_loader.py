@@ -0,0 +1,49 @@
+import os
+
+from deepnotes.loaders.document_loader import DocumentLoader
+from deepnotes.models.loader_models import DocumentLoadedData
+from deepnotes.models.source_models import SourceConfig, SourceType
+
+
+def test_document_loader_process_nested_directory(tmp_path):
+    (tmp_path / "a.txt").write_text("alpha")
+    nested = tmp_path / "nested" / "deeper"
+    nested.mkdir(parents=True)
+    (nested / "b.md").write_text("# beta")
+
+    loader = DocumentLoader(
+        SourceConfig(
+            type=SourceType.DOCUMENT,
+            name="test_documents",
+            connection={"path": str(tmp_path)},
+        )
+    )
+    result = loader.process()
+
+    assert isinstance(result, DocumentLoadedData)
+    assert sorted(d.metadata.file_path for d in result.documents) == sorted(
+        [str(tmp_path / "a.txt"), str(nested / "b.md")]
+    )
+    assert sorted(result.global_metadata["file_types"]) == [".md", ".txt"]
+    assert result.global_metadata["total_chunks"] == 2
+
+
+def test_iter_files_matches_os_walk_for_symlinks(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "target.txt").write_text("target")
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "own.txt").write_text("own")
+    (root / "link.txt").symlink_to(source / "target.txt")
+    # A directory link back to the root must not be descended into
+    (root / "loop").symlink_to(root, target_is_directory=True)
+
+    walked = sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        for name in names
+    )
+
+    assert sorted(DocumentLoader._iter_files(str(root))) == walked
+    assert walked == [str(root / "link.txt"), str(root / "own.txt")]
@@ -0,0 +1,180 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from deepnotes.storage.document_storage import (
+    ChunkAnalysisModel,
+    DocumentAnalysisModel,
+    DocumentModel,
+    DocumentStore,
+    _normalize_path,
+)
+
+
+def test_store_chunks_bulk_inserts_in_order(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'deepnotes.db'}")
+    document_id = store.store_document(str(tmp_path / "a.txt"), "hash", {})
+
+    stored = store.store_chunks(
+        document_id,
+        [{"text": "alpha"}, {"text": "beta", "metadata": {"page": 2}}],
+    )
+
+    assert [(c.index, c.content) for c in stored] == [(0, "alpha"), (1, "beta")]
+    assert all(c.id is not None for c in stored)
+    chunks = store.get_chunks(document_id)
+    assert [(c.index, c.content, c.meta_info) for c in chunks] == [
+        (0, "alpha", {}),
+        (1, "beta", {"page": 2}),
+    ]
+    assert store.store_chunks(document_id, []) == []
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'deepnotes.db'}")
+
+    with store.engine.connect() as connection:
+        pragmas = {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("journal_mode", "synchronous", "foreign_keys")
+        }
+
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "foreign_keys": 1}
+
+
+def test_lookup_indexes_added_to_existing_database(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'deepnotes.db'}"
+    store = DocumentStore(database_url)
+    with store.engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_chunk_doc_idx")
+
+    store = DocumentStore(database_url)
+
+    with store.engine.connect() as connection:
+        indexes = {
+            row[1]
+            for row in connection.exec_driver_sql("PRAGMA index_list(document_chunks)")
+        }
+    assert {"ix_chunk_doc_idx", "ix_document_chunks_document_id"} <= indexes
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'deepnotes.db'}")
+
+    with pytest.raises(RuntimeError):
+        with store.transaction() as session:
+            session.add(DocumentModel(path="a.txt", hash="hash", meta_info={}))
+            session.flush()
+            raise RuntimeError("boom")
+
+    assert store.get_document_by_path("a.txt") is None
+
+
+def test_stores_share_outer_transaction(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'deepnotes.db'}")
+
+    with store.transaction() as session:
+        document_id = store.store_document("a.txt", "hash", {}, session=session)
+        (chunk,) = store.store_chunks(document_id, [{"text": "alpha"}], session=session)
+        analysis = store.store_chunk_analysis(
+            chunk.id, {"summary": "s"}, session=session
+        )
+        assert analysis.id is not None
+        # Nothing is visible outside the transaction until it commits
+        assert store.get_document(document_id) is None
+
+    document = store.get_document(document_id)
+    assert document.path.endswith("a.txt")
+    assert document.created_at is not None and document.updated_at is not None
+    assert [c.content for c in store.get_chunks(document_id)] == ["alpha"]
+
+
+def test_analysis_data_stored_compressed(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'deepnotes.db'}")
+    document_id = store.store_document("a.txt", "hash", {})
+    analysis_data = {"summary": "s" * 1000, "entities": [{"id": "a"}]}
+
+    store.store_analysis(document_id, analysis_data)
+
+    with store.engine.connect() as connection:
+        raw = connection.exec_driver_sql(
+            "SELECT analysis_data FROM document_analyses"
+        ).scalar()
+        # Rows written before compression still decode
+        connection.exec_driver_sql(
+            "INSERT INTO document_analyses (document_id, analysis_data, created_at) "
+            "VALUES (?, ?, CURRENT_TIMESTAMP)",
+            (document_id, '{"summary": "legacy"}'),
+        )
+        connection.commit()
+    assert isinstance(raw, bytes) and len(raw) < 100
+    with store.SessionLocal() as session:
+        stored = session.scalars(select(DocumentAnalysisModel.analysis_data)).all()
+    assert stored == [analysis_data, {"summary": "legacy"}]
+
+
+def test_analysis_data_keeps_native_json_column_outside_sqlite():
+    column_type = DocumentAnalysisModel.__table__.c.analysis_data.type
+    dialect = postgresql.dialect()
+
+    assert column_type.compile(dialect=dialect) == "JSON"
+    assert column_type.process_bind_param({"a": 1}, dialect) == {"a": 1}
+    assert column_type.process_result_value({"a": 1}, dialect) == {"a": 1}
+
+
+def test_document_paths_normalized_to_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = DocumentStore(f"sqlite:///{tmp_path / 'deepnotes.db'}")
+    document_id = store.store_document("docs/../a.txt", "hash", {})
+
+    assert store.get_document_by_path(tmp_path / "a.txt").id == document_id
+
+
+def test_existing_database_with_duplicate_paths(tmp_path):
+    database_path = tmp_path / "deepnotes.db"
+    path = str(tmp_path / "a.txt")
+    with sqlite3.connect(database_path) as connection:
+        connection.execute(
+            "CREATE TABLE documents (id INTEGER PRIMARY KEY, path VARCHAR(500), "
+            "hash VARCHAR(64), meta_info JSON, created_at DATETIME, updated_at DATETIME)"
+        )
+        connection.executemany(
+            "INSERT INTO documents (path, hash, meta_info) VALUES (?, ?, '{}')",
+            [(path, "old"), (path, "newer")],
+        )
+    connection.close()
+
+    store = DocumentStore(f"sqlite:///{database_path}")
+    newest = store.get_document_by_path(path)
+    document_id = store.store_document(path, "updated", {"k": "v"})
+
+    assert newest.hash == "newer"
+    assert document_id == newest.id
+    assert store.store_document(path, "again", {}) == document_id
+    assert store.get_document_by_path(path).hash == "again"
+
+
+def test_relative_paths_follow_working_directory(tmp_path, monkeypatch):
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+        monkeypatch.chdir(tmp_path / name)
+
+        assert _normalize_path("a.txt") == str(tmp_path / name / "a.txt")
+
+
+def test_reingest_replaces_chunks_and_analyses(tmp_path):
+    store = DocumentStore(f"sqlite:///{tmp_path / 'deepnotes.db'}")
+    document_id = store.store_document("a.txt", "old", {})
+    (chunk, _) = store.store_chunks(document_id, [{"text": "x"}, {"text": "y"}])
+    store.store_chunk_analysis(chunk.id, {"summary": "x"})
+    store.store_analysis(document_id, {"summary": "old"})
+
+    assert store.store_document("a.txt", "new", {}) == document_id
+    store.store_chunks(document_id, [{"text": "z"}])
+
+    assert [(c.index, c.content) for c in store.get_chunks(document_id)] == [(0, "z")]
+    with store.SessionLocal() as session:
+        assert session.scalars(select(ChunkAnalysisModel)).all() == []
+        assert session.scalars(select(DocumentAnalysisModel)).all() == []
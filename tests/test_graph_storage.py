@@ -0,0 +1,379 @@
+import gzip
+
+import pytest
+
+from deepnotes.models.analyzer_models import Entity, Relationship
+from deepnotes.storage import graph_storage
+from deepnotes.storage.graph_storage import (
+    MemoryStorage,
+    Neo4jStorage,
+    NetworkXStorage,
+    _map_fields,
+)
+
+
+class FakeNeo4jDriver:
+    """
+    Stub driver recording schema statements and write transaction queries. Writes
+    return their rows as the stored properties, as if nothing had been stored yet.
+    """
+
+    def __init__(self):
+        self.schema = []
+        self.transactions = []
+        self.sessions = []
+        self.closed = False
+        # Records returned by successive read queries
+        self.records = []
+        self.reads = 0
+
+    def session(self, database=None):
+        self.sessions.append(database)
+        return self
+
+    def close(self):
+        self.closed = True
+
+    def execute_read(self, work):
+        self.reads += 1
+        records = self.records
+
+        class Tx:
+            def run(self, query, **params):
+                return iter(records.pop(0))
+
+        return work(Tx())
+
+    def execute_write(self, work):
+        queries = []
+
+        class Tx:
+            def run(self, query, **params):
+                queries.append((query, params))
+                return iter(
+                    {"props": FakeNeo4jDriver.stored_properties(row)}
+                    for row in params.get("rows", ())
+                )
+
+        result = work(Tx())
+        if queries[0][0].startswith("CREATE"):
+            self.schema.extend(query for query, _ in queries)
+        else:
+            self.transactions.append(queries)
+        return result
+
+    @staticmethod
+    def stored_properties(row):
+        if isinstance(row, dict):
+            return {k: row[k] for k in ("source", "target")} | row["props"]
+        # Entity rows hold the scalar fields, then the JSON-encoded dict fields
+        fields = [
+            *(name for name in Entity.model_fields if name not in _map_fields(Entity)),
+            *_map_fields(Entity),
+        ]
+        return {
+            name: value
+            for name, value in zip(fields, row, strict=True)
+            if value is not None
+        }
+
+
+@pytest.fixture
+def neo4j_driver(monkeypatch):
+    driver = FakeNeo4jDriver()
+    monkeypatch.setattr(graph_storage.GraphDatabase, "driver", lambda *a, **kw: driver)
+    return driver
+
+
+def test_networkx_save_writes_compact_graphml(tmp_path):
+    graph_file = tmp_path / "graph.graphml"
+    storage = NetworkXStorage(graph_file)
+    storage.graph.add_node("a", name="A", type="concept")
+    storage.graph.add_node("b", name="B", type="concept")
+    storage.graph.add_edge("a", "b", key="a__uses__b", type="uses")
+
+    storage.save()
+
+    assert graph_file.read_text().count("\n") <= 1
+    reloaded = NetworkXStorage(graph_file)
+    assert reloaded.graph.nodes["a"] == {"name": "A", "type": "concept"}
+    assert reloaded._rel_index == {"a__uses__b": ("a", "b", "a__uses__b")}
+
+
+def test_networkx_relationship_lookup_and_merge_by_id(tmp_path):
+    storage = NetworkXStorage(tmp_path / "graph.graphml")
+    for entity_id in "ab":
+        storage.graph.add_node(entity_id, name=entity_id.upper(), type="concept")
+    rel = Relationship(source="a", target="b", type="uses")
+
+    storage.merge_relationship(rel)
+    merged = storage.merge_relationship(
+        Relationship(source="a", target="b", type="uses", attributes={"weight": 2})
+    )
+
+    assert storage.get_relationship("missing") is None
+    assert merged.attributes == {"weight": 2}
+    assert storage.get_relationship(rel.id).attributes == {"weight": 2}
+    assert storage.graph.number_of_edges() == 1
+
+
+def test_neo4j_merges_in_unwind_batches(neo4j_driver):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password")
+    storage.write_batch_size = 2
+    entities = [Entity(id=f"e{i}", name=f"E{i}", type="concept") for i in range(5)]
+
+    assert storage.merge_entities_batch(entities) == entities
+    storage.merge_relationship(Relationship(source="e0", target="e1", type="uses"))
+
+    batches = [queries[0][1]["rows"] for queries in neo4j_driver.transactions]
+    assert [len(rows) for rows in batches] == [2, 2, 1, 1]
+    assert batches[-1][0]["id"] == "e0__uses__e1"
+    assert all("UNWIND $rows" in queries[0][0] for queries in neo4j_driver.transactions)
+
+
+def test_neo4j_reuses_one_session_per_thread(neo4j_driver):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password", database="notes")
+
+    storage.merge_entity(Entity(id="a", name="A", type="concept"))
+    storage.merge_entity(Entity(id="b", name="B", type="concept"))
+    storage.close()
+
+    assert neo4j_driver.sessions == ["notes"]
+    assert len(neo4j_driver.transactions) == 2
+    assert neo4j_driver.closed
+
+
+def test_neo4j_creates_id_constraint_and_index(neo4j_driver):
+    Neo4jStorage("bolt://localhost", "neo4j", "password")
+
+    assert len(neo4j_driver.schema) == 2
+    assert "REQUIRE e.id IS UNIQUE" in neo4j_driver.schema[0]
+    assert "ON (r.id)" in neo4j_driver.schema[1]
+    assert all("IF NOT EXISTS" in statement for statement in neo4j_driver.schema)
+
+
+@pytest.mark.parametrize(
+    "make_storage",
+    [
+        lambda tmp_path: NetworkXStorage(tmp_path / "graph.graphml"),
+        lambda _: MemoryStorage(),
+    ],
+)
+def test_find_duplicate_entities(tmp_path, make_storage):
+    storage = make_storage(tmp_path)
+    storage.merge_entity(Entity(id="ml", name="ML", type="concept"))
+    storage.merge_entity(Entity(id="machine_learning", name="ml", type="concept"))
+    storage.merge_entity(Entity(id="ai", name="AI", type="concept"))
+
+    groups = storage.find_duplicate_entities()
+
+    assert [sorted(e.id for e in group) for group in groups] == [
+        ["machine_learning", "ml"]
+    ]
+
+
+@pytest.mark.parametrize(
+    "make_storage",
+    [
+        lambda tmp_path: NetworkXStorage(tmp_path / "graph.graphml"),
+        lambda _: MemoryStorage(),
+    ],
+)
+def test_merge_entity_updates_explicit_fields(tmp_path, make_storage):
+    storage = make_storage(tmp_path)
+    storage.merge_entity(
+        Entity(
+            id="a", name="A", type="concept", description="first", attributes={"k": 1}
+        )
+    )
+
+    merged = storage.merge_entity(
+        Entity(id="a", name="A", type="concept", attributes={"k": 2})
+    )
+
+    assert (merged.description, merged.attributes) == ("first", {"k": 2})
+    assert storage.get_entity("a") == merged
+
+
+def test_neo4j_reads_graph_in_one_transaction(neo4j_driver):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password")
+    neo4j_driver.records = [
+        [{"e": {"id": "a", "name": "A", "type": "concept"}}],
+        [{"r": {"source": "a", "target": "a", "type": "self"}}],
+    ]
+
+    graph = storage.get_knowledge_graph()
+
+    assert [e.id for e in graph.entities] == ["a"]
+    assert [r.id for r in graph.relationships] == ["a__self__a"]
+    assert neo4j_driver.reads == 1
+
+
+def test_memory_storage_stores_fields_column_wise():
+    storage = MemoryStorage()
+    storage.merge_entity(Entity(id="a", name="A", type="concept"))
+    storage.merge_entity(Entity(id="b", name="B", type="concept"))
+    storage.merge_relationship(Relationship(source="a", target="b", type="uses"))
+
+    assert storage.entities.columns["name"] == ["A", "B"]
+    graph = storage.get_knowledge_graph()
+    assert [e.id for e in graph.entities] == ["a", "b"]
+    assert [r.id for r in graph.relationships] == ["a__uses__b"]
+    assert storage.get_entity("missing") is None
+
+
+@pytest.mark.parametrize("serializer", ["jsonl", "pickle"])
+@pytest.mark.parametrize("suffix", ["", ".gz"])
+def test_networkx_snapshot_round_trip(tmp_path, serializer, suffix):
+    graph_file = tmp_path / f"graph.{serializer}{suffix}"
+    storage = NetworkXStorage(graph_file, serializer=serializer)
+    storage.merge_entity(Entity(id="a", name="A", type="concept", attributes={"k": 1}))
+    storage.merge_entity(Entity(id="b", name="B", type="concept"))
+    rel = Relationship(source="a", target="b", type="uses")
+    storage.merge_relationship(rel)
+
+    storage.save()
+    reloaded = NetworkXStorage(graph_file, serializer=serializer)
+
+    assert reloaded.get_entity("a") == storage.get_entity("a")
+    assert reloaded.get_relationship(rel.id) == rel
+
+
+def test_networkx_rejects_unknown_serializer(tmp_path):
+    with pytest.raises(ValueError):
+        NetworkXStorage(tmp_path / "graph.bin", serializer="xml")
+
+
+def test_neo4j_writes_batches_on_writer_threads(neo4j_driver):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password", writers=2)
+    storage.write_batch_size = 2
+    entities = [Entity(id=f"e{i}", name=f"E{i}", type="concept") for i in range(5)]
+
+    storage.merge_entities_batch(entities)
+    storage.close()
+
+    written = [
+        row[0] for queries in neo4j_driver.transactions for row in queries[0][1]["rows"]
+    ]
+    assert sorted(written) == [entity.id for entity in entities]
+    assert len(neo4j_driver.transactions) == 3
+
+
+def test_neo4j_entity_rows_follow_generated_query(neo4j_driver):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password")
+
+    storage.merge_entity(
+        Entity(id="a", name="A", type="concept", metadata={"src": "x"})
+    )
+
+    ((query, params),) = neo4j_driver.transactions[0]
+    assert query == storage._entity_query
+    assert "e.name = coalesce(row[1], e.name)" in query
+    assert "e.metadata = coalesce(row[5], e.metadata)" in query
+    assert "+=" not in query
+    # Dict fields are sent as JSON strings, and only when explicitly set
+    assert params["rows"] == [["a", "A", None, "concept", None, '{"src": "x"}']]
+
+
+def test_neo4j_dict_fields_round_trip_as_json(neo4j_driver):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password")
+    rel = Relationship(source="a", target="b", type="uses", attributes={"w": 1})
+
+    storage.merge_relationship(rel)
+    neo4j_driver.records = [
+        [{"e": {"id": "a", "name": "A", "type": "concept", "metadata": '{"k": 1}'}}],
+        [{"r": dict(neo4j_driver.transactions[0][0][1]["rows"][0]["props"])}],
+    ]
+    graph = storage.get_knowledge_graph()
+
+    props = neo4j_driver.transactions[0][0][1]["rows"][0]["props"]
+    assert props["attributes"] == '{"w": 1}'
+    assert graph.entities[0].metadata == {"k": 1}
+    assert graph.relationships == [rel]
+
+
+def test_get_graph_storage_returns_shared_instance(monkeypatch):
+    monkeypatch.setattr(
+        graph_storage, "get_config", lambda: {"graph": {"storage_type": "memory"}}
+    )
+    graph_storage.get_graph_storage.cache_clear()
+
+    storage = graph_storage.get_graph_storage()
+
+    assert isinstance(storage, MemoryStorage)
+    assert graph_storage.get_graph_storage() is storage
+    graph_storage.get_graph_storage.cache_clear()
+
+
+def test_networkx_graphml_gz_is_compressed(tmp_path):
+    graph_file = tmp_path / "graph.graphml.gz"
+    storage = NetworkXStorage(graph_file)
+    storage.graph.add_node("a", name="A", type="concept")
+
+    storage.save()
+
+    assert gzip.decompress(graph_file.read_bytes()).startswith(b"<?xml")
+    assert NetworkXStorage(graph_file).graph.nodes["a"]["name"] == "A"
+
+
+def test_memory_duplicate_buckets_follow_renames():
+    storage = MemoryStorage()
+    storage.merge_entity(Entity(id="ml", name="ML", type="concept"))
+    storage.merge_entity(
+        Entity(id="machine_learning", name="Machine Learning", type="concept")
+    )
+
+    assert storage.find_duplicate_entities() == []
+
+    storage.merge_entity(Entity(id="machine_learning", name="ml", type="concept"))
+
+    assert [[e.id for e in group] for group in storage.find_duplicate_entities()] == [
+        ["ml", "machine_learning"]
+    ]
+    storage.clear()
+    assert storage.find_duplicate_entities() == []
+
+
+def test_neo4j_find_duplicate_entities_streams_groups(neo4j_driver):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password")
+    neo4j_driver.records = [
+        [
+            {
+                "group": [
+                    {"id": "ml", "name": "ML", "type": "concept"},
+                    {"id": "machine_learning", "name": "ml", "type": "concept"},
+                ]
+            }
+        ]
+    ]
+
+    groups = storage.find_duplicate_entities()
+
+    assert [[e.id for e in group] for group in groups] == [["ml", "machine_learning"]]
+
+
+def test_networkx_knowledge_graph_built_without_validation(tmp_path, monkeypatch):
+    storage = NetworkXStorage(tmp_path / "graph.graphml")
+    storage.merge_entity(Entity(id="a", name="A", type="concept"))
+    storage.merge_relationship(Relationship(source="a", target="a", type="self"))
+    monkeypatch.setattr(
+        Entity, "__init__", lambda *a, **kw: pytest.fail("entity validated")
+    )
+
+    graph = storage.get_knowledge_graph()
+
+    assert [e.id for e in graph.entities] == ["a"]
+    assert [r.id for r in graph.relationships] == ["a__self__a"]
+
+
+def test_neo4j_merge_returns_stored_versions(neo4j_driver, monkeypatch):
+    storage = Neo4jStorage("bolt://localhost", "neo4j", "password")
+    stored = {"id": "a", "name": "A", "type": "concept", "description": "kept"}
+    monkeypatch.setattr(
+        FakeNeo4jDriver, "stored_properties", staticmethod(lambda row: stored)
+    )
+
+    (merged,) = storage.merge_entities_batch([Entity(id="a", name="A", type="concept")])
+
+    assert "RETURN properties(e) AS props" in storage._entity_query
+    assert merged.description == "kept"
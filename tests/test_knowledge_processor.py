@@ -0,0 +1,420 @@
+import asyncio
+import json
+import re
+import threading
+
+import pytest
+
+from deepnotes.llm.llm_wrapper import LLMConfig, LLMResponse
+from deepnotes.models.analyzer_models import (
+    ConsolidationAnalysisResult,
+    Entity,
+    EntityBatchResolutionResult,
+    KnowledgeGraph,
+    Relationship,
+)
+from deepnotes.processors import knowledge_processor
+from deepnotes.storage.graph_storage import MemoryStorage
+
+
+class FakeLLM:
+    """Stub LLM merging conflicting entities by taking the new entity"""
+
+    def __init__(self):
+        self.config = LLMConfig(
+            provider="fake", model="fake", base_url=None, api_key=None, api_version=None
+        )
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def generate(self, prompt, parse_json=True, response_model=None, routing_key=None):
+        with self.lock:
+            self.prompts.append(prompt)
+        new_entities = [
+            Entity.model_validate_json(raw)
+            for raw in re.findall(r"New Entity: (\{.*\})", prompt)
+        ]
+        if response_model is EntityBatchResolutionResult:
+            instance = EntityBatchResolutionResult(entities=new_entities)
+        elif new_entities:
+            instance = new_entities[0]
+        else:
+            instance = Entity(id="merged", name="Merged", type="concept")
+        return LLMResponse(
+            content=instance.model_dump_json(),
+            provider="fake",
+            model="fake",
+            input_tokens=0,
+            output_tokens=0,
+            model_instance=instance,
+        )
+
+    async def agenerate(
+        self, prompt, parse_json=True, response_model=None, routing_key=None
+    ):
+        return self.generate(prompt, parse_json, response_model)
+
+
+class LoopBoundLLM(FakeLLM):
+    """Stub LLM that, like a pooled async HTTP client, only works on its first loop"""
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    async def agenerate(
+        self, prompt, parse_json=True, response_model=None, routing_key=None
+    ):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError("Event loop is closed")
+        await asyncio.sleep(0)
+        return self.generate(prompt, parse_json, response_model)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    llm = FakeLLM()
+    monkeypatch.setattr(knowledge_processor, "get_llm_model", lambda: llm)
+    return llm
+
+
+@pytest.fixture
+def storage(monkeypatch, fake_llm):
+    storage = MemoryStorage()
+    monkeypatch.setattr(knowledge_processor, "get_graph_storage", lambda: storage)
+    return storage
+
+
+def make_processor(config=None):
+    return knowledge_processor.KnowledgeProcessor(
+        {"llm_cache_path": None, **(config or {})}
+    )
+
+
+def make_result(entities, relationships=()):
+    return ConsolidationAnalysisResult(
+        knowledge_graph=KnowledgeGraph(
+            entities=list(entities), relationships=list(relationships)
+        )
+    )
+
+
+def test_merge_analysis_adds_and_updates(storage):
+    processor = make_processor()
+    processor.merge_analysis(
+        [
+            make_result(
+                [
+                    Entity(id="a", name="A", type="concept"),
+                    Entity(id="b", name="B", type="concept"),
+                ],
+                [Relationship(source="a", target="b", type="relates_to")],
+            )
+        ]
+    )
+    processor.merge_analysis(
+        [
+            make_result(
+                [Entity(id="a", name="A", type="concept", attributes={"k": "v"})],
+                # Dangling relationship is rejected by validation
+                [Relationship(source="a", target="missing", type="relates_to")],
+            )
+        ]
+    )
+
+    graph = processor.get_knowledge_graph()
+    assert {e.id for e in graph.entities} == {"a", "b"}
+    assert [r.id for r in graph.relationships] == ["a__relates_to__b"]
+    assert processor._entity_index["a"].attributes == {"k": "v"}
+
+
+def test_prune_orphans_keeps_indexes_in_sync(storage):
+    storage.merge_entity(Entity(id="a", name="A", type="concept"))
+    storage.merge_entity(Entity(id="b", name="B", type="concept"))
+    storage.merge_entity(Entity(id="orphan", name="Orphan", type="concept"))
+    storage.merge_entity(
+        Entity(
+            id="pinned", name="Pinned", type="concept", metadata={"keep_always": True}
+        )
+    )
+    storage.merge_relationship(Relationship(source="a", target="b", type="relates_to"))
+    storage.merge_relationship(
+        Relationship(source="a", target="gone", type="relates_to")
+    )
+    processor = make_processor()
+
+    processor._prune_orphans()
+
+    assert set(processor._entity_index) == {"a", "b", "pinned"}
+    assert set(processor._rel_index) == {"a__relates_to__b"}
+    assert [r.id for r in processor.get_knowledge_graph().relationships] == [
+        "a__relates_to__b"
+    ]
+
+
+def test_entity_conflicts_resolved_in_batches(storage, fake_llm):
+    for idx in range(5):
+        storage.merge_entity(Entity(id=f"e{idx}", name=f"Old {idx}", type="concept"))
+    processor = make_processor({"conflict_batch_size": 2})
+
+    processor.merge_analysis(
+        [
+            make_result(
+                [
+                    Entity(id=f"e{idx}", name=f"New {idx}", type="concept")
+                    for idx in range(5)
+                ]
+            )
+        ]
+    )
+
+    # Two batched requests of two conflicts plus a single-conflict request
+    assert len(fake_llm.prompts) == 3
+    assert {e.name for e in processor.get_knowledge_graph().entities} == {
+        f"New {idx}" for idx in range(5)
+    }
+
+
+def test_merge_entity_group_unions_without_llm(storage, fake_llm):
+    processor = make_processor()
+
+    group = [
+        Entity(id="ml", name="ML", type="concept", attributes={"a": 1}),
+        Entity(
+            id="machine_learning",
+            name="ml",
+            type="concept",
+            description="Learning from data",
+            attributes={"a": 1, "b": 2},
+        ),
+    ]
+
+    merged = asyncio.run(processor._merge_entity_group(group))
+
+    assert fake_llm.prompts == []
+    assert merged.id == "ml"
+    assert merged.description == "Learning from data"
+    assert merged.attributes == {"a": 1, "b": 2}
+
+
+def test_merge_entity_group_uses_llm_on_conflict(storage, fake_llm):
+    processor = make_processor()
+
+    group = [
+        Entity(id="ml", name="ML", type="concept", attributes={"a": 1}),
+        Entity(id="machine_learning", name="ml", type="concept", attributes={"a": 2}),
+    ]
+
+    asyncio.run(processor._merge_entity_group(group))
+
+    assert len(fake_llm.prompts) == 1
+
+
+def test_get_entity_connections_uses_endpoint_index(storage):
+    for entity_id in "abc":
+        storage.merge_entity(
+            Entity(id=entity_id, name=entity_id.upper(), type="concept")
+        )
+    storage.merge_relationship(Relationship(source="a", target="b", type="uses"))
+    processor = make_processor()
+    processor.merge_analysis(
+        [make_result([], [Relationship(source="c", target="a", type="cites")])]
+    )
+
+    assert processor._get_entity_connections("a") == (
+        "- a__uses__b (uses)\n- c__cites__a (cites)"
+    )
+    assert processor._get_entity_connections("b") == "- a__uses__b (uses)"
+
+
+def test_merge_analysis_does_not_reload_graph(storage, monkeypatch):
+    processor = make_processor()
+    monkeypatch.setattr(
+        storage,
+        "get_knowledge_graph",
+        lambda: pytest.fail("graph reloaded from storage during merge"),
+    )
+
+    processor.merge_analysis(
+        [
+            make_result([Entity(id="a", name="A", type="concept")]),
+            make_result([Entity(id="b", name="B", type="concept")]),
+        ]
+    )
+
+    assert {e.id for e in processor.get_knowledge_graph().entities} == {"a", "b"}
+
+
+def test_merge_writes_entities_and_relationships_in_batches(storage, monkeypatch):
+    processor = make_processor()
+    batches = []
+    for name in ("merge_entities_batch", "merge_relationships_batch"):
+        original = getattr(storage, name)
+        monkeypatch.setattr(
+            storage,
+            name,
+            lambda items, original=original, name=name: (
+                batches.append((name, len(items))) or original(items)
+            ),
+        )
+
+    processor.merge_analysis(
+        [
+            make_result(
+                [
+                    Entity(id=entity_id, name=entity_id, type="concept")
+                    for entity_id in "abc"
+                ],
+                [
+                    Relationship(source="a", target="b", type="uses"),
+                    Relationship(source="b", target="c", type="uses"),
+                ],
+            )
+        ]
+    )
+
+    assert ("merge_entities_batch", 3) in batches
+    assert ("merge_relationships_batch", 2) in batches
+    assert len(storage.entities) == 3
+    assert len(storage.relationships) == 2
+
+
+def test_unchanged_resubmission_skips_storage_writes(storage, monkeypatch):
+    processor = make_processor()
+    result = make_result(
+        [
+            Entity(id="a", name="A", type="concept"),
+            Entity(id="b", name="B", type="concept"),
+        ],
+        [Relationship(source="a", target="b", type="uses")],
+    )
+    processor.merge_analysis([result])
+    for name in ("merge_entities_batch", "merge_relationships_batch"):
+        monkeypatch.setattr(
+            storage, name, lambda items: pytest.fail("unexpected write")
+        )
+
+    changes = processor.merge_analysis([result])
+
+    assert changes["skipped"] == 3
+    assert changes["entities_updated"] == changes["relationships_updated"] == 0
+
+
+def test_repeated_conflict_served_from_cache(storage, fake_llm):
+    processor = make_processor()
+    group = [
+        Entity(id="ml", name="ML", type="concept", attributes={"a": 1}),
+        Entity(id="machine_learning", name="ml", type="concept", attributes={"a": 2}),
+    ]
+
+    asyncio.run(processor._merge_entity_group(group))
+    asyncio.run(processor._merge_entity_group(group))
+
+    assert len(fake_llm.prompts) == 1
+    assert processor.llm.cache_stats()["hits"] == 1
+    entities_json = fake_llm.prompts[0].splitlines()[1].strip()
+    assert json.loads(entities_json) == [e.model_dump(mode="json") for e in group]
+
+
+def test_resolve_conflicts_writes_merged_entities(storage, fake_llm):
+    storage.merge_entity(
+        Entity(id="ml", name="ML", type="concept", attributes={"a": 1})
+    )
+    storage.merge_entity(
+        Entity(id="machine_learning", name="ml", type="concept", attributes={"b": 2})
+    )
+    storage.merge_entity(Entity(id="other", name="Other", type="concept"))
+    processor = make_processor()
+
+    asyncio.run(processor._resolve_conflicts())
+
+    assert fake_llm.prompts == []
+    assert storage.get_entity("ml").attributes == {"a": 1, "b": 2}
+    assert processor._entity_index["ml"].attributes == {"a": 1, "b": 2}
+
+
+def test_optimize_graph_revisits_only_dirty_regions(storage, fake_llm):
+    storage.merge_entity(
+        Entity(id="ml", name="ML", type="concept", attributes={"a": 1})
+    )
+    storage.merge_entity(
+        Entity(id="machine_learning", name="ml", type="concept", attributes={"a": 2})
+    )
+    processor = make_processor()
+    processor._dirty_entity_ids.clear()
+
+    processor.merge_analysis(
+        [
+            make_result(
+                [
+                    Entity(id="a", name="A", type="concept"),
+                    Entity(id="b", name="B", type="concept"),
+                    Entity(id="lonely", name="Lonely", type="concept"),
+                ],
+                [Relationship(source="a", target="b", type="uses")],
+            )
+        ]
+    )
+    asyncio.run(processor._optimize_graph())
+
+    # Duplicates and orphans outside the written region are not revisited
+    assert fake_llm.prompts == []
+    assert set(processor._entity_index) == {"ml", "machine_learning", "a", "b"}
+    assert processor._dirty_entity_ids == set()
+
+
+def test_resolve_conflicts_groups_names_by_casefold(storage, fake_llm):
+    storage.merge_entity(Entity(id="strasse", name="STRASSE", type="place"))
+    storage.merge_entity(
+        Entity(id="strasse_de", name="Straße", type="place", attributes={"lang": "de"})
+    )
+    processor = make_processor()
+
+    asyncio.run(processor._resolve_conflicts())
+
+    assert storage.get_entity("strasse").attributes == {"lang": "de"}
+
+
+def test_merge_resolves_all_conflicts_on_one_event_loop(storage, monkeypatch):
+    llm = LoopBoundLLM()
+    monkeypatch.setattr(knowledge_processor, "get_llm_model", lambda: llm)
+    storage.merge_entity(Entity(id="a", name="Old A", type="concept"))
+    storage.merge_entity(Entity(id="b", name="Old B", type="concept"))
+    processor = make_processor()
+
+    processor.merge_analysis(
+        [
+            make_result([Entity(id="a", name="New A", type="concept")]),
+            make_result([Entity(id="b", name="New B", type="concept")]),
+        ]
+    )
+
+    assert len(llm.prompts) == 2
+    assert {e.name for e in processor.get_knowledge_graph().entities} == {
+        "New A",
+        "New B",
+    }
+
+
+def test_unresolved_conflicts_are_not_written(storage, fake_llm, monkeypatch):
+    storage.merge_entity(Entity(id="a", name="Old A", type="concept"))
+    processor = make_processor()
+
+    async def unresolved(
+        prompt, parse_json=True, response_model=None, routing_key=None
+    ):
+        response = fake_llm.generate(prompt, parse_json, response_model)
+        if response_model is EntityBatchResolutionResult:
+            return response
+        return response.model_copy(update={"model_instance": None})
+
+    monkeypatch.setattr(fake_llm, "agenerate", unresolved)
+
+    processor.merge_analysis(
+        [make_result([Entity(id="a", name="New A", type="concept")])]
+    )
+
+    assert storage.get_entity("a").name == "Old A"
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+from deepnotes.llm.llm_cache import CachedLLM
+from deepnotes.llm.llm_wrapper import LLMConfig, LLMResponse
+from deepnotes.models.analyzer_models import ChunkAnalysisResult
+
+
+class CountingLLM:
+    """Stub LLM counting the requests that reach it"""
+
+    def __init__(self):
+        self.config = LLMConfig(
+            provider="fake", model="fake", base_url=None, api_key=None, api_version=None
+        )
+        self.calls = 0
+
+    def generate(self, prompt, parse_json=True, response_model=None, routing_key=None):
+        self.calls += 1
+        instance = ChunkAnalysisResult(chunk_index=self.calls, summary=prompt)
+        return LLMResponse(
+            content=instance.model_dump_json(),
+            provider="fake",
+            model="fake",
+            input_tokens=10,
+            output_tokens=5,
+            model_instance=instance,
+        )
+
+    async def agenerate(
+        self, prompt, parse_json=True, response_model=None, routing_key=None
+    ):
+        return self.generate(prompt, parse_json, response_model)
+
+
+def test_cached_llm_serves_repeated_prompts_from_memory():
+    llm = CountingLLM()
+    cached = CachedLLM(llm)
+
+    first = cached.generate("prompt", response_model=ChunkAnalysisResult)
+    second = cached.generate("prompt", response_model=ChunkAnalysisResult)
+    other = cached.generate("other prompt", response_model=ChunkAnalysisResult)
+
+    assert llm.calls == 2
+    assert second.model_instance == first.model_instance
+    assert second.input_tokens == 0
+    assert other.model_instance.summary == "other prompt"
+
+
+def test_cached_llm_persists_across_instances(tmp_path):
+    cache_path = str(tmp_path / "cache" / "llm_cache.db")
+    llm = CountingLLM()
+    CachedLLM(llm, cache_path).generate("prompt", response_model=ChunkAnalysisResult)
+
+    response = CachedLLM(llm, cache_path).generate(
+        "prompt", response_model=ChunkAnalysisResult
+    )
+
+    assert llm.calls == 1
+    assert response.model_instance.summary == "prompt"
+
+
+def test_cached_llm_cache_stats():
+    cached = CachedLLM(CountingLLM())
+
+    cached.generate("prompt")
+    cached.generate("prompt")
+    cached.generate("other prompt")
+
+    assert cached.cache_stats() == {"hits": 1, "misses": 2, "memory_items": 2}
+
+
+def test_cached_llm_keys_on_response_model():
+    llm = CountingLLM()
+    cached = CachedLLM(llm)
+
+    cached.generate("prompt", response_model=ChunkAnalysisResult)
+    cached.generate("prompt")
+
+    assert llm.calls == 2
+
+
+def test_cached_llm_key_includes_language():
+    llm = CountingLLM()
+    cached = CachedLLM(llm)
+
+    cached.generate("prompt")
+    llm.config.language = "chinese"
+    cached.generate("prompt")
+
+    assert llm.calls == 2
+
+
+def test_cached_llm_async_disk_access_off_event_loop(tmp_path):
+    cached = CachedLLM(CountingLLM(), str(tmp_path / "llm_cache.db"))
+    threads = []
+    for name in ("_get", "_set"):
+        original = getattr(cached, name)
+
+        def record(*args, original=original):
+            threads.append(threading.get_ident())
+            return original(*args)
+
+        setattr(cached, name, record)
+
+    async def generate():
+        await cached.agenerate("prompt")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(generate())
+
+    assert len(threads) == 2
+    assert loop_thread not in threads
@@ -0,0 +1,50 @@
+import asyncio
+
+from deepnotes.llm.llm_wrapper import LLMConfig, LLMWrapper
+
+
+def make_wrapper(replica_urls=None):
+    return LLMWrapper(
+        LLMConfig(
+            provider="vllm",
+            model="fake",
+            base_url="http://primary/v1",
+            api_key="test",
+            api_version=None,
+            replica_urls=replica_urls,
+        )
+    )
+
+
+def test_get_client_without_replicas_uses_primary():
+    wrapper = make_wrapper()
+
+    assert wrapper._get_client("prefix") is wrapper.client
+
+
+def test_get_client_pins_routing_key_to_replica():
+    replica_urls = [f"http://replica-{idx}/v1" for idx in range(3)]
+    wrapper = make_wrapper(replica_urls)
+
+    client = wrapper._get_client("static prompt prefix")
+
+    assert wrapper._get_client("static prompt prefix") is client
+    assert str(client.base_url).rstrip("/") in replica_urls
+    assert wrapper._get_client(None) is wrapper.client
+    assert {
+        str(wrapper._get_client(f"prefix {idx}").base_url) for idx in range(20)
+    } == {url + "/" for url in replica_urls}
+
+
+def test_async_client_is_bound_to_running_loop():
+    wrapper = make_wrapper(["http://replica-0/v1"])
+
+    async def clients():
+        return wrapper.async_client, wrapper._get_client("prefix", use_async=True)
+
+    first = asyncio.run(clients())
+    second = asyncio.run(clients())
+
+    assert first[0] is not second[0]
+    assert first[1] is not second[1]
+    assert str(second[1].base_url) == "http://replica-0/v1/"